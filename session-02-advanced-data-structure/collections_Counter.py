@@ -1,5 +1,5 @@
 # import
-from collections import Counter
+from collections import Counter, defaultdict
 
 """create a counter"""
 # 1. From a string
@@ -121,11 +121,35 @@ counter = Counter(s)
 arr = [1, 2, 3, 3, -1]
 counter = Counter(x for x in arr if x > 0)
 
+# Don't count with a Python loop:
+#   for x in arr: counter[x] += 1       # __getitem__/__setitem__ per element
+# Counter(arr) and counter.update(arr) both hand the iterable to the C helper
+# collections._count_elements, so they're equally fast (2-5x faster than the loop)
+counter = Counter()
+counter.update(arr)                       # add more counts later, same fast path
+
 # Pattern 2: Check if two strings are anagrams
 s1 = 'string'
 s2 = 'stingr'
 Counter(s1) == Counter(s2)
 
+# Optimized anagram: for ASCII, a fixed 256-slot histogram avoids building
+# two dicts and returns early on the first surplus character.
+# (sorted(s1.encode()) == sorted(s2.encode()) is another dict-free option)
+def is_anagram(a, b):
+    if len(a) != len(b):
+        return False
+    if not (a.isascii() and b.isascii()):
+        return Counter(a) == Counter(b)   # bytes of multi-byte chars can't be counted separately
+    h = [0] * 256
+    for x in a.encode():
+        h[x] += 1
+    for x in b.encode():
+        h[x] -= 1
+        if h[x] < 0:
+            return False
+    return True
+
 # Pattern 3: Find missing/extra elements
 list1 = ['a', 'b', 'b', 'c']
 list2 = ['b', 'c', 'c', 'd']
@@ -137,23 +161,42 @@ extra = c2 - c1    # Elements in list2 but not enough in list1
 
 
 # Pattern 4: Sliding window with Counter
+# `window == need` on every step is O(k) (k = distinct chars), so the scan is O(n*k).
+# Instead track `matches` = number of chars whose window count equals need count;
+# each step changes at most 2 counts, so it's O(1) per step and O(n) overall.
 pattern = 'abc'
 s = "cbaebabacd"
 need = Counter(pattern)
-window = Counter(s[:len(pattern)])
+# plain defaultdict(int): zero counts are left in place - with `matches`
+# nothing compares whole dicts, so a 0 entry is harmless, and skipping
+# del avoids delete/re-insert churn in the hash table
+window = defaultdict(int, Counter(s[:len(pattern)]))  # initial counts via Counter's C loop
+matches = sum(1 for c, v in need.items() if window[c] == v)
+
+result = [0] if matches == len(need) else []
 
 # Slide
 for i in range(len(pattern), len(s)):
-    window[s[i]] += 1
-    
+    c_in = s[i]
+    if c_in in need and window[c_in] == need[c_in]:
+        matches -= 1                # was matching, about to overshoot
+    window[c_in] += 1
+    if c_in in need and window[c_in] == need[c_in]:
+        matches += 1
+
     left = i - len(pattern)
-    window[s[left]] -= 1
-    if window[s[left]] == 0:
-        del window[s[left]]  # Clean up zeros
-    
-    if window == need:
-        # Found match
-        pass
+    c_out = s[left]
+    if c_out in need and window[c_out] == need[c_out]:
+        matches -= 1
+    window[c_out] -= 1
+    if c_out in need and window[c_out] == need[c_out]:
+        matches += 1
+
+    if matches == len(need):
+        # Found match: anagram starts at left + 1
+        result.append(left + 1)
+
+print(result)  # [0, 6]
 
 # Pattern 5: Find top k frequent elements
 nums = [3, 3, 2, 1, 4, 5]
@@ -161,6 +204,24 @@ k = 2
 counter = Counter(nums)
 print([num for num, _ in counter.most_common(k)])
 
+# NumPy fast path: large arrays of non-negative ints
+# Counter hashes every element in the interpreter; np.bincount builds the
+# histogram in C, and argpartition picks top-k in O(n) instead of a heap.
+# For general hashables (strings, tuples, negatives) stick to most_common.
+def top_k_frequent_np(nums, k):
+    import numpy as np
+    counts = np.bincount(np.asarray(nums))          # counts[v] = frequency of v
+    k = min(k, np.count_nonzero(counts))
+    if k <= 0:
+        return []  # argpartition(counts, -0)[-0:] would return every value
+    top_idx = np.argpartition(counts, -k)[-k:]      # k largest, unordered
+    top_idx = top_idx[np.argsort(-counts[top_idx])]  # order by frequency desc
+    return top_idx.tolist()
+
+# top_k_frequent_np(nums, k)  # [3, ...]
+# For sparse / huge value ranges: vals, counts = np.unique(nums, return_counts=True)
+# then vals[np.argpartition(counts, -k)[-k:]]
+
 # Pattern 6: Check if enough resources
 inventory = {'book1': 3, 'book2': 2}
 order = {'book1': 1, 'book2': 3}
@@ -178,7 +239,8 @@ Tips
 - Arithmetic operations keep only positive counts (except subtraction with - unary)
 - Use del or set to 0 to remove elements (they're equivalent for comparison)
 - Counter is a subclass of dict, so all dict methods work
-- For sliding window: manually delete zero-count elements to avoid memory issues
+- For sliding window: Counter equality treats missing as 0, so deleting zero-count
+  elements only saves memory - unnecessary for bounded alphabets (see Pattern 4)
 
 Time Complexity
 
@@ -29,7 +29,7 @@ d.extendleft([0, 1])   # Result: deque([1, 0, 2, 3])
 # ============================================================================
 
 d.pop()                # Remove and return from right - O(1)
-d.popleft()           # Remove and return from left - O(1)
+d.popleft()           # Remove and return from left - O(1) (list.pop(0) is O(n))
 d.remove(x)           # Remove first occurrence of x - O(n)
 d.clear()             # Remove all elements
 
@@ -77,7 +77,18 @@ d.maxlen              # Max size (None if unbounded)
 # -----------------------
 q = deque()
 q.append(x)           # Enqueue
-x = q.popleft()       # Dequeue
+x = q.popleft()       # Dequeue - O(1)
+
+# Don't use a list as a queue: list.pop(0) shifts every remaining element
+# left, so it is O(n) and a loop of n dequeues becomes O(n^2).
+# (CPython docs: "lists ... pop(0) ... require O(n) memory movement")
+# q = [];  q.append(x);  x = q.pop(0)     # O(n) per dequeue - avoid
+
+# Many queues keyed by name: defaultdict(deque) instead of dict of lists
+from collections import defaultdict
+queues = defaultdict(deque)   # dict[str, deque[str]]
+queues['emails'].append('msg-1')
+msg = queues['emails'].popleft()   # not queues['emails'].pop(0)
 
 
 # Pattern 2: Stack (LIFO)
@@ -143,6 +154,35 @@ def sliding_window_max(nums, k):
     return result
 
 
+# Same algorithm without deque method calls: the window never holds more
+# than k indices, so a fixed list of size k used as a ring buffer with
+# head/tail counters is enough. Plain int ops instead of popleft/pop/append.
+def sliding_window_max_fast(nums, k):
+    buf = [0] * k         # ring buffer of indices
+    head = tail = 0       # live slots are buf[head % k] .. buf[(tail - 1) % k]
+    result = []
+
+    for i, num in enumerate(nums):
+        # Remove index outside window (at most one per step)
+        if head < tail and buf[head % k] <= i - k:
+            head += 1
+
+        # Remove smaller elements (maintain decreasing order)
+        while head < tail and nums[buf[(tail - 1) % k]] < num:
+            tail -= 1
+
+        buf[tail % k] = i
+        tail += 1
+
+        if i >= k - 1:
+            result.append(nums[buf[head % k]])
+
+    return result
+
+# For long int64/float64 arrays use the Numba kernel in
+# sliding_window_max_numba.py - same loop compiled to native code.
+
+
 # ============================================================================
 # TIME COMPLEXITIES
 # ============================================================================
@@ -211,6 +251,26 @@ def is_palindrome(s):
             return False
     return True
 
+# Production version: two pointers over one lowered copy (O(n) extra memory, like
+# the deque, but no per-character objects and no deque allocation).
+# lower() as in is_palindrome: casefold() would change answers ('ßss' -> 'ssss').
+# Indexing bytes returns ints, so each comparison stays in C.
+def is_palindrome_fast(s):
+    b = s.lower()
+    if b.isascii():
+        b = b.encode()     # ASCII: compare bytes; otherwise index the str directly
+    i, j = 0, len(b) - 1
+    while i < j:
+        if b[i] != b[j]:
+            return False
+        i += 1
+        j -= 1
+    return True
+
+# Same answers as the reference, ASCII and non-ASCII
+for text in ["", "a", "racecar", "RaceCar", "hello", "ßss", "Straße", "été", "Ωmω"]:
+    assert is_palindrome_fast(text) == is_palindrome(text), text
+
 
 # Example 3: Undo/Redo functionality
 undo_stack = deque(maxlen=50)    # Last 50 actions
@@ -246,6 +306,35 @@ class MovingAverage:
         self.sum += val
         return self.sum / len(self.queue)
 
+# Long float streams: repeated += / -= on self.sum drifts. Fixed-size ring
+# buffer (array of C doubles, no deque) + Kahan compensated summation.
+import array
+
+class StableMovingAverage:
+    def __init__(self, size):
+        self.buf = array.array('d', [0.0] * size)
+        self.size = size
+        self.head = 0      # slot to overwrite next (= oldest value when full)
+        self.count = 0
+        self.sum = 0.0
+        self.c = 0.0       # Kahan compensation (lost low-order bits)
+
+    def _add(self, x):
+        y = x - self.c
+        t = self.sum + y
+        self.c = (t - self.sum) - y
+        self.sum = t
+
+    def next(self, val):
+        if self.count == self.size:
+            self._add(-self.buf[self.head])   # drop the oldest value
+        else:
+            self.count += 1
+        self.buf[self.head] = val
+        self._add(val)
+        self.head = (self.head + 1) % self.size
+        return self.sum / self.count
+
 
 # Example 5: Task scheduler with priorities
 from collections import deque
@@ -63,6 +63,8 @@ print(numbers)
 numbers = [1, 2, 3]
 last = numbers.pop()
 print(last, numbers)
+# pop(0) also works but is O(n): every remaining element shifts left.
+# For FIFO queues use collections.deque and popleft() - O(1).
 
 # reverse
 numbers = [1, 2, 3]
@@ -0,0 +1,40 @@
+# Numba-compiled sliding window maximum
+# pip install numba numpy
+#
+# Same monotonic-deque algorithm as sliding_window_max in collections_deque.py,
+# but the loop is compiled to native code: no deque method calls, no boxed ints.
+# Use it for long numeric arrays; for LeetCode-size inputs the pure Python
+# version is fine (the first call pays the JIT compile, cache=True keeps it on disk).
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def sliding_window_max(nums, k):
+    n = nums.shape[0]
+    buf = np.empty(k, dtype=np.int64)              # ring buffer of indices
+    result = np.empty(max(n - k + 1, 0), dtype=nums.dtype)
+    head = 0
+    tail = 0
+
+    for i in range(n):
+        # Remove index outside window
+        if head < tail and buf[head % k] <= i - k:
+            head += 1
+
+        # Remove smaller elements (maintain decreasing order)
+        while head < tail and nums[buf[(tail - 1) % k]] < nums[i]:
+            tail -= 1
+
+        buf[tail % k] = i
+        tail += 1
+
+        if i >= k - 1:
+            result[i - k + 1] = nums[buf[head % k]]
+
+    return result
+
+
+if __name__ == "__main__":
+    nums = np.array([1, 3, -1, -3, 5, 3, 6, 7], dtype=np.int64)
+    print(sliding_window_max(nums, 3))  # [3 3 5 5 6 7]
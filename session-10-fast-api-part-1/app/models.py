@@ -31,6 +31,8 @@ class User(SQLModel, table=True):
 class Note(SQLModel, table=True):
     
     __tablename__ = 'notes' #type: ignore
+    # list_notes pages over all notes by id, served by the primary key index;
+    # add (user_id, id) once listing is scoped to the current user
     id: int | None = Field(default=None, primary_key=True)
     title: str = Field(max_length=50)
     content: str
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, status, HTTPException
 from sqlmodel import select
-from app.schemas import NoteCreate, NoteResponse, NoteUpdate
+from sqlalchemy import update
+from sqlalchemy.orm import raiseload
+from app.schemas import NoteCreate, NoteResponse, NoteUpdate, NoteListResponse
 from app.models import Note
 from datetime import datetime
 
@@ -44,13 +46,24 @@ When a request comes in:
 This all happens automatically! 🎉
 """
 
-@router.get("/", response_model=list[NoteResponse])
-def list_notes(db: DBSession, limit: int = 10, offset: int = 0):
+@router.get("/", response_model=NoteListResponse)
+def list_notes(db: DBSession, limit: int = 10, after_id: int | None = None):
     """List all notes"""
     # For now, get all notes (will filter by user in Session 2)
-    statement = select(Note).offset(offset).limit(limit)
+    # NoteResponse only exposes user_id, so Note.user is never needed here.
+    # raiseload makes any accidental note.user access fail loudly instead of
+    # lazy-loading one extra query per row (N+1). If the response ever
+    # includes user fields, use .options(selectinload(Note.user)) instead.
+    # limit + 1: the extra row only tells whether another page exists
+    statement = select(Note).options(raiseload(Note.user)).order_by(Note.id).limit(limit + 1)
+    # Keyset pagination: OFFSET n makes the DB read and discard n rows,
+    # WHERE id > after_id seeks straight to the page through the PK index
+    if after_id is not None:
+        statement = statement.where(Note.id > after_id)
     notes = db.exec(statement).all()
-    return notes
+    has_more = len(notes) > limit
+    notes = notes[:limit]
+    return {"items": notes, "next": notes[-1].id if has_more else None}
 
 @router.get("/{note_id}", response_model=NoteResponse)
 def get_note(note_id: int, db: DBSession):
@@ -66,25 +79,26 @@ def get_note(note_id: int, db: DBSession):
 @router.patch("/{note_id}", response_model=NoteResponse)
 def update_note(note_id: int, note_update: NoteUpdate, db: DBSession):
     """Update a note"""
-    db_note = db.get(Note, note_id)
-    if not db_note:
+    update_data = note_update.model_dump(exclude_unset=True)
+
+    # One round trip: UPDATE ... WHERE id = :id RETURNING *
+    # instead of db.get() (SELECT) + setattr + commit (UPDATE).
+    # Keep the load + setattr version only when the old values are needed (e.g. audit log)
+    statement = (
+        update(Note)
+        .where(Note.id == note_id)
+        .values(**update_data, updated_at=datetime.now())
+        .returning(*Note.__table__.columns)  # plain row, not an ORM object expired by commit
+    )
+    row = db.execute(statement).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Note with id {note_id} not found"
         )
-    
-    # Update fields
-    update_data = note_update.model_dump(exclude_unset=True)
-    
-    # Update fields
-    for key, value in update_data.items():
-        setattr(db_note, key, value)
-    
-    db_note.updated_at = datetime.now()
-    db.add(db_note)
     db.commit()
-    
-    return db_note
+
+    return dict(row._mapping)
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_note(note_id: int, db: DBSession):
@@ -30,4 +30,9 @@ class NoteResponse(Notebase):
     updated_at: datetime
     
     class config: #adapt to Pydantic
-        from_attribute = True
\ No newline at end of file
+        from_attribute = True
+
+
+class NoteListResponse(BaseModel):
+    items: list[NoteResponse]
+    next: Optional[int] = None  # pass as after_id to get the next page
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from blog.models import Post, Comment,Category
 
 # Register your models here.
@@ -15,10 +16,16 @@ admin.site.site_title = 'My Blog Portal'
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'post_count', 'created_at')
-    
+
+    # obj.posts.count() would run one COUNT query per row,
+    # annotate counts all categories in a single GROUP BY query
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_post_count=Count('posts'))
+
     def post_count(self, obj):
-        return obj.posts.count()
+        return obj._post_count
     post_count.short_description = 'Number of posts'
+    post_count.admin_order_field = '_post_count'  # Allow sorting by this column
     
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -44,6 +51,19 @@ class PostAdmin(admin.ModelAdmin):
     
     search_fields = ('title', 'author__username', 'content')
 
+    # One query for the whole changelist instead of 2N+1:
+    # author via JOIN, categories prefetched, counts aggregated with GROUP BY
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related('author')
+            .prefetch_related('categories')
+            .annotate(
+                _comment_count=Count('comments', distinct=True),
+                _category_count=Count('categories', distinct=True),
+            )
+        )
+
     def get_categories(self, obj):
         return ", ".join([c.name for c in obj.categories.all()])
     get_categories.short_description = 'Categories'
@@ -57,6 +77,6 @@ class PostAdmin(admin.ModelAdmin):
 
     # NEW: Custom admin method - show if multiple categories
     def multiple_cats(self, obj):
-        return obj.has_multiple_categories()
+        return obj._category_count > 1
     multiple_cats.boolean = True
     multiple_cats.short_description = 'Multiple Categories?'
\ No newline at end of file
@@ -51,6 +51,11 @@ class Post(models.Model):
     
     # Custom model method
     def comment_count(self):
+        # Use the annotated value if the queryset provided one
+        # (.annotate(_comment_count=Count('comments'))), so list pages
+        # don't run one COUNT query per post
+        if hasattr(self, '_comment_count'):
+            return self._comment_count
         return self.comments.count()
     
     def get_excerpt(self):
@@ -69,6 +74,8 @@ class Post(models.Model):
 
     def has_multiple_categories(self):
         """Check if post has more than one category"""
+        if hasattr(self, '_category_count'):
+            return self._category_count > 1
         return self.categories.count() > 1
 
 
@@ -1,11 +1,19 @@
 from django.shortcuts import render, HttpResponse, Http404, get_object_or_404
 from blog.models import Post, Category, Comment
 from django.contrib.auth.models import User
-from django.db.models import F
+from django.db.models import Count
 # Create your views here.
 # posts/
 def post_list(request):
-    posts = Post.objects.filter(published=True).all()
+    # .all() is redundant on a filtered queryset
+    # select_related: author via JOIN; prefetch_related: categories in one extra IN query
+    # (avoids the 2N+1 queries from post.author / post.categories.all in the template)
+    posts = (
+        Post.objects.filter(published=True)
+        .select_related('author')
+        .prefetch_related('categories')
+        .annotate(_comment_count=Count('comments', distinct=True))  # post.comment_count without per-row COUNT
+    )
     # return HttpResponse(f'List view {posts.count()}')
     context = {
         'posts': posts
@@ -14,20 +22,25 @@ def post_list(request):
 
 # posts/<int:post_id>
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    if not post:
-        raise Http404("Not found")
-    
     # INCREASE VIEW COUNT
     # post.views += 1
     # post.save()
     # OR
     # More efficient - avoids race conditions
-    Post.objects.filter(id=post_id).update(views=F('views') + 1)
-    # Refresh the post object to get updated views count
-    post.refresh_from_db()
+    # Post.objects.filter(id=post_id).update(views=F('views') + 1)
+    # but that still needs a separate SELECT to read the post.
+    # PostgreSQL: UPDATE ... RETURNING increments and reads the row in one
+    # round trip; raw() maps the returned row to a Post instance.
+    posts = list(Post.objects.raw(
+        f"UPDATE {Post._meta.db_table} SET views = views + 1 WHERE id = %s RETURNING *",
+        [post_id],
+    ))
+    if not posts:
+        raise Http404("Not found")
+    post = posts[0]
 
-    comments = post.comments.all()
+    # comment.author.username in the template -> JOIN instead of a query per comment
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'comments': comments
@@ -38,7 +51,13 @@ def post_detail(request, post_id):
 # categories/<int:category_id>
 def category_post(request, category_id):
     category = get_object_or_404(Category, id=category_id)
-    posts = category.posts.filter(published=True).prefetch_related('categories', 'author')
+    # author is a ForeignKey -> select_related (JOIN), categories is M2M -> prefetch_related
+    posts = (
+        category.posts.filter(published=True)
+        .select_related('author')
+        .prefetch_related('categories')
+        .annotate(_comment_count=Count('comments', distinct=True))  # post.comment_count without per-row COUNT
+    )
     # for post in posts: #n+1 problem to prefetch to resolve
     #     post.author()
 
@@ -51,7 +70,12 @@ def category_post(request, category_id):
 # authors/<int:author_id>
 def author_post(request, author_id):
     user = get_object_or_404(User, id=author_id)
-    posts = user.posts.filter(published=True).prefetch_related('categories')
+    posts = (
+        user.posts.filter(published=True)
+        .select_related('author')
+        .prefetch_related('categories')
+        .annotate(_comment_count=Count('comments', distinct=True))  # post.comment_count without per-row COUNT
+    )
     context = {
         'posts': posts,
         'author': user
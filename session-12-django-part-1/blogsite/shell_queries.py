@@ -13,6 +13,7 @@ django.setup()
 # Now import models
 from blog.models import Post, Category, Comment
 from django.contrib.auth.models import User
+from django.db.models import Count
 
 def main():
     print("=" * 60)
@@ -21,22 +22,24 @@ def main():
 
     # 1. Published posts
     print("\n1. Published posts:")
-    published = Post.objects.filter(published=True)
-    print(f"   Count: {published.count()}")
+    # list(...) runs one query; len() reuses it instead of a separate COUNT
+    # select_related: post.author.username without one query per post
+    published = list(Post.objects.filter(published=True).select_related('author'))
+    print(f"   Count: {len(published)}")
     for post in published:
         print(f"   • {post.title} by {post.author.username}")
 
     # 2. Posts by john
     print("\n2. Posts by user 'john':")
-    john_posts = Post.objects.filter(author__username='john')
-    print(f"   Count: {john_posts.count()}")
+    john_posts = list(Post.objects.filter(author__username='john'))
+    print(f"   Count: {len(john_posts)}")
     for post in john_posts:
         print(f"   • {post.title}")
 
     # 3. Posts in Technology
     print("\n3. Posts in 'Technology' category:")
-    tech_posts = Post.objects.filter(categories__name='Technology')
-    print(f"   Count: {tech_posts.count()}")
+    tech_posts = list(Post.objects.filter(categories__name='Technology'))
+    print(f"   Count: {len(tech_posts)}")
     for post in tech_posts:
         print(f"   • {post.title}")
 
@@ -50,8 +53,8 @@ def main():
 
     # 6. Posts with no categories
     print("\n6. Posts with no categories:")
-    no_cats = Post.objects.filter(categories__isnull=True)
-    print(f"   Count: {no_cats.count()}")
+    no_cats = list(Post.objects.filter(categories__isnull=True))
+    print(f"   Count: {len(no_cats)}")
     for post in no_cats:
         print(f"   • {post.title}")
 
@@ -63,9 +66,10 @@ def main():
 
     # 8. Categories alphabetically
     print("\n8. Categories (alphabetical):")
-    categories = Category.objects.order_by('name')
+    # annotate: one GROUP BY query instead of cat.posts.count() per category
+    categories = Category.objects.annotate(n=Count('posts')).order_by('name')
     for cat in categories:
-        print(f"   • {cat.name} ({cat.posts.count()} posts)")
+        print(f"   • {cat.name} ({cat.n} posts)")
 
     print("\n" + "=" * 60)
     print("ALL QUERIES COMPLETED!")
@@ -1,13 +1,30 @@
-from .models import Post
+from .models import Post, User
 from rest_framework import serializers
 
+class AuthorMiniSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email')
+
 class PostSerializer(serializers.ModelSerializer):
     # Read-only field from related model
     author_email = serializers.ReadOnlyField(source='author.email')
 
     class Meta:
         model = Post
-        fields = '__all__' # Include all model fields
+        # fields = '__all__' # Include all model fields
+        # List fields explicitly: new model columns aren't serialized by accident
+        fields = ('id', 'title', 'content', 'author', 'published', 'author_email', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'author_email')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # author_email reads obj.author -> JOIN once instead of 1 query per post,
+        # and only load the author columns we output
+        return queryset.select_related('author').only(
+            'id', 'title', 'content', 'published', 'created_at', 'updated_at',
+            'author__id', 'author__email',
+        )
         
 class PostListSerializer(serializers.ModelSerializer):
     author_email = serializers.ReadOnlyField(source='author.email')
@@ -16,19 +33,28 @@ class PostListSerializer(serializers.ModelSerializer):
         model = Post
         # Only specific fields for list view (lighter payload)
         fields = ['id', 'title', 'content', 'author', 'published', 'author_email', 'created_at']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # JOIN author, and only fetch the columns this serializer outputs
+        return queryset.select_related('author').only(
+            'id', 'title', 'content', 'published', 'created_at',
+            'author__id', 'author__email',
+        )
         
 class PostDetailsSerializer(serializers.ModelSerializer):
-    # Custom method field
-    author = serializers.SerializerMethodField()
+    # Nested serializer instead of a SerializerMethodField building a dict:
+    # the fields are declared, so the queryset can fetch just those 3 columns
+    author = AuthorMiniSerializer(read_only=True)
 
     class Meta:
         model = Post
         fields = ['id', 'title', 'content', 'author', 'published', 'created_at', 'updated_at']
-        
-    def get_author(self, obj):
-        return {
-            'id': obj.author.id,
-            'username': obj.author.username,
-            'email': obj.author.email,
-        }
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related('author').only(
+            'id', 'title', 'content', 'published', 'created_at', 'updated_at',
+            'author__id', 'author__username', 'author__email',
+        )
         
\ No newline at end of file
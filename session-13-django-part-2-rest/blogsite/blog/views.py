@@ -38,15 +38,18 @@ class PostViewSet(
     # permission_classes=[IsAuthenticated, HasCreatePostPermission] # User must be authenticated AND has create post permission
     
     def get_queryset(self):
+        # Each serializer knows which relations it reads (obj.author...),
+        # so let it add select_related / only() - avoids 1 query per post (N+1)
+        serializer_class = self.get_serializer_class()
         if self.action == 'list':
             # return Post.objects.filter(published=True).all()
             print(self.request.query_params)
             order_by = self.request.query_params.get('order_by' ,'')
             if order_by:
-                return Post.objects.order_by(order_by).all()
-            return Post.objects.all()
+                return serializer_class.setup_eager_loading(Post.objects.order_by(order_by))
+            return serializer_class.setup_eager_loading(Post.objects.all())
         elif self.action == 'retrieve':
-             return Post.objects.all()
+             return serializer_class.setup_eager_loading(Post.objects.all())
          
     def get_permissions(self):
         return super().get_permissions()
@@ -1,57 +1,218 @@
 # For production with multiple servers, use Redis
-import redis
+import math
 import time
-from fastapi import HTTPException
+from typing import Optional
+import redis
+from redis.asyncio import Redis as AsyncRedis
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
 
-class RedisRateLimiter:
-    """Redis-based rate limiter for distributed systems"""
-    
-    def __init__(self, redis_client: redis.Redis, max_requests: int, window_seconds: int):
+# Token bucket in a Redis HASH {tokens, last_refill}: 2 numbers per user,
+# instead of one sorted-set member per request (sliding window).
+# Runs inside Redis, so refill + consume is atomic across app servers,
+# and TIME gives every server the same clock.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last_refill')
+local tokens = tonumber(bucket[1])
+local last_refill = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    last_refill = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - last_refill) * refill_rate)
+
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last_refill', now)
+-- after capacity / refill_rate seconds the bucket is full again = same as no key
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate))
+
+return {allowed, tostring(tokens)}
+"""
+
+
+class TokenBucketScript:
+    """Everything but the round trip: script, key and arguments, and reading the reply.
+    The sync and async limiters below differ only in how they call the script."""
+
+    def __init__(self, redis_client, max_requests: int, window_seconds: int):
         self.redis = redis_client
         self.max_requests = max_requests
         self.window_seconds = window_seconds
+        # Bucket holds max_requests tokens, refilled at max_requests per window
+        self.capacity = max_requests
+        self.refill_rate = max_requests / window_seconds
+        # register_script: calls EVALSHA, and re-sends the script if Redis
+        # lost its script cache (restart/failover) instead of raising NoScriptError.
+        # A redis.asyncio client returns an AsyncScript, whose call is awaitable
+        self.script = self.redis.register_script(TOKEN_BUCKET_LUA)
+
+    def _call_args(self, user_id: str) -> dict:
+        return {'keys': [f"rate_limit:{user_id}"], 'args': [self.capacity, self.refill_rate]}
+
+    @staticmethod
+    def _parse(reply) -> tuple[bool, float]:
+        allowed, tokens = reply
+        return allowed == 1, float(tokens)
+
+    def retry_after(self, tokens: float) -> int:
+        # The script already returned the token count - no extra call to compute it
+        return max(1, math.ceil((1 - tokens) / self.refill_rate))
+
+
+class RedisRateLimiter(TokenBucketScript):
+    """Redis-based rate limiter for distributed systems (token bucket)"""
+    
+    def __init__(self, redis_client: redis.Redis, max_requests: int, window_seconds: int):
+        super().__init__(redis_client, max_requests, window_seconds)
+    
+    def _consume(self, user_id: str) -> tuple[bool, float]:
+        """One round trip: refill, consume and TTL run atomically inside Redis.
+        A plain pipeline is not enough - another server could read the same
+        count between our read and write and both would be allowed."""
+        return self._parse(self.script(**self._call_args(user_id)))
     
     def allow_request(self, user_id: str) -> bool:
-        """Using Redis sorted set for sliding window"""
-        key = f"rate_limit:{user_id}"
-        now = time.time()
-        window_start = now - self.window_seconds
-        
-        # Use Redis pipeline for atomic operations
-        pipe = self.redis.pipeline()
-        
-        # Remove old entries
-        pipe.zremrangebyscore(key, 0, window_start)
-        
-        # Count requests in current window
-        pipe.zcard(key)
-        
-        # Add current request
-        pipe.zadd(key, {str(now): now})
-        
-        # Set expiration
-        pipe.expire(key, self.window_seconds)
-        
-        # Execute pipeline
-        results = pipe.execute()
-        
-        request_count = results[1]
-        
-        return request_count < self.max_requests
+        allowed, _ = self._consume(user_id)
+        return allowed
     
     def check_or_raise(self, user_id: str):
-        if not self.allow_request(user_id):
+        allowed, tokens = self._consume(user_id)
+        if not allowed:
             raise HTTPException(
                 status_code=429,
                 detail=f"Rate limit exceeded",
-                headers={"Retry-After": str(self.window_seconds)}
+                headers={"Retry-After": str(self.retry_after(tokens))}
             )
 
-# Usage in FastAPI
-redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
-rate_limiter = RedisRateLimiter(redis_client, max_requests=100, window_seconds=60)
+
+class AsyncRedisRateLimiter(TokenBucketScript):
+    """Same token bucket script, on redis.asyncio: the event loop keeps serving
+    other requests while this one waits for Redis"""
+
+    def __init__(self, redis_client: AsyncRedis, max_requests: int, window_seconds: int):
+        super().__init__(redis_client, max_requests, window_seconds)
+
+    async def allow_async(self, user_id: str) -> tuple[bool, float]:
+        return self._parse(await self.script(**self._call_args(user_id)))
+
+
+# Helper function to get user ID from header or IP
+def get_user_id(
+    x_user_id: Optional[str] = Header(None),
+    x_forwarded_for: Optional[str] = Header(None)
+) -> str:
+    """
+    Get user identifier from header or IP address.
+    Priority: x-user-id > x-forwarded-for > "anonymous"
+    """
+    if x_user_id:
+        return x_user_id
+    if x_forwarded_for:
+        # First IP in chain - partition doesn't build a list of every hop
+        return x_forwarded_for.partition(',')[0].strip()
+    return "anonymous"
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Check the limit before the route runs, without blocking the event loop
+    (a sync check_or_raise inside a def endpoint holds a worker thread for the Redis round trip)"""
+
+    def __init__(self, app, limiter: AsyncRedisRateLimiter, paths: tuple[str, ...] = ('/orders',)):
+        super().__init__(app)
+        self.limiter = limiter
+        self.paths = paths
+
+    async def dispatch(self, request: Request, call_next):
+        if not request.url.path.startswith(self.paths):
+            return await call_next(request)
+
+        # Same identity as the Depends(get_user_id) routes, so limits line up
+        user_id = get_user_id(request.headers.get('x-user-id'), request.headers.get('x-forwarded-for'))
+        allowed, tokens = await self.limiter.allow_async(user_id)
+        if not allowed:
+            return JSONResponse(
+                {'detail': 'Rate limit exceeded'},
+                status_code=429,
+                headers={'Retry-After': str(self.limiter.retry_after(tokens))},
+            )
+        return await call_next(request)
+
+
+# Fixed window: one integer per user per window, one O(1) command per request.
+# Cheaper than the token bucket, but allows up to 2x max_requests around a
+# window boundary - fine for high-volume endpoints that just need a cap.
+FIXED_WINDOW_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+
+class FixedWindowRedisRateLimiter:
+    """Redis INCR + EXPIRE fixed window rate limiter"""
+
+    def __init__(self, redis_client: redis.Redis, max_requests: int, window_seconds: int):
+        self.redis = redis_client
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.script = self.redis.register_script(FIXED_WINDOW_LUA)
+
+    def _hit(self, user_id: str) -> tuple[int, float]:
+        # Wall clock on purpose: every server must agree on the window number
+        now = time.time()
+        window = int(now // self.window_seconds)
+        key = f"rl:{user_id}:{window}"
+        count = self.script(keys=[key], args=[self.window_seconds])
+        return count, now
+
+    def allow_request(self, user_id: str) -> bool:
+        count, _ = self._hit(user_id)
+        return count <= self.max_requests
+
+    def check_or_raise(self, user_id: str):
+        count, now = self._hit(user_id)
+        if count > self.max_requests:
+            # seconds until the current window ends
+            retry_after = max(1, math.ceil(self.window_seconds - (now % self.window_seconds)))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Max {self.max_requests} requests per {self.window_seconds} seconds.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+
+# Usage in FastAPI: the check runs in middleware, awaiting Redis on the event loop,
+# so the route itself is a plain async def with no limiter call
+app = FastAPI()
+async_redis_client = AsyncRedis(host='localhost', port=6379, decode_responses=True)
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=AsyncRedisRateLimiter(async_redis_client, max_requests=100, window_seconds=60),
+)
 
 @app.post('/orders')
-def create_order(customer: str, amount: float, user_id: str = Depends(get_user_id)):
-    rate_limiter.check_or_raise(user_id)
-    # ... rest of code
\ No newline at end of file
+async def create_order(customer: str, amount: float):
+    ...  # rest of code
+
+# Sync alternative, per route (holds a worker thread for the Redis round trip):
+# redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
+# rate_limiter = FixedWindowRedisRateLimiter(redis_client, max_requests=100, window_seconds=60)
+#
+# @app.post('/orders')
+# def create_order(customer: str, amount: float, user_id: str = Depends(get_user_id)):
+#     rate_limiter.check_or_raise(user_id)
\ No newline at end of file
@@ -1,6 +1,10 @@
-from collections import defaultdict
-from typing import Dict, List
-import time
+from collections import defaultdict, deque
+from typing import Deque, Dict
+import threading
+# monotonic: never jumps backwards when NTP adjusts the wall clock
+# (time.time() could make elapsed time negative); bound to a module-level
+# name so hot paths skip the time.<attr> lookup
+from time import monotonic as _now
 from fastapi import HTTPException
 
 class RateLimiter:
@@ -11,29 +15,52 @@ class RateLimiter:
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        # Store list of request timestamps for each user
-        self.user_requests: Dict[str, List[float]] = defaultdict(list)
+        # Store request timestamps for each user, oldest on the left
+        # deque: expired timestamps are popped from the left in O(1)
+        self.user_requests: Dict[str, Deque[float]] = defaultdict(deque)
+        # Every distinct user would stay in user_requests forever:
+        # sweep idle users every _gc_every calls (amortized, no timer thread)
+        self._calls = 0
+        self._gc_every = 10_000
+        # FastAPI runs def endpoints in a thread pool: without a lock two threads
+        # can both see len < max_requests and both append (over the limit)
+        self._lock = threading.Lock()
     
     def allow_request(self, user_id: str) -> bool:
         """
         Check if user can make a request.
         Returns True if allowed, False if rate limited.
         """
-        now = time.time()
+        with self._lock:
+            # read the clock under the lock so timestamps are appended in order
+            now = _now()
+            self._calls += 1
+            if self._calls % self._gc_every == 0:
+                self._gc(now)
         
-        # Get user's request history
-        requests = self.user_requests[user_id]
+            # Get user's request history
+            requests = self.user_requests[user_id]
         
-        # Remove timestamps outside the current window
-        cutoff_time = now - self.window_seconds
-        requests[:] = [ts for ts in requests if ts > cutoff_time]
+            # Remove timestamps outside the current window
+            # Timestamps are appended in order, so expired ones are all at the left:
+            # pop just those instead of rebuilding the whole list every call
+            cutoff_time = now - self.window_seconds
+            while requests and requests[0] <= cutoff_time:
+                requests.popleft()
         
-        # Check if under the limit
-        if len(requests) < self.max_requests:
-            requests.append(now)
-            return True
+            # Check if under the limit
+            if len(requests) < self.max_requests:
+                requests.append(now)
+                return True
         
-        return False
+            return False
+    
+    def _gc(self, now: float) -> None:
+        """Drop users whose newest request is outside the window - nothing to remember"""
+        cutoff_time = now - self.window_seconds
+        for user_id, requests in list(self.user_requests.items()):
+            if not requests or requests[-1] <= cutoff_time:
+                del self.user_requests[user_id]
     
     def check_or_raise(self, user_id: str):
         """
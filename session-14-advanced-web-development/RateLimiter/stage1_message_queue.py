@@ -1,7 +1,8 @@
 from fastapi import FastAPI, Depends, HTTPException, Header
 from celery import Celery
 from celery.result import AsyncResult
-import uuid
+import secrets
+from time import monotonic
 from typing import Optional
 from stage1_Basic_rate_limiter import RateLimiter
 
@@ -13,9 +14,10 @@ app_celery = Celery(
 )
 
 app_celery.conf.update(
-    task_serializer="json",
-    accept_content=['json'],
-    result_serializer='json'
+    # msgpack: smaller task/result bodies than JSON and faster to (de)serialize (pip install msgpack)
+    task_serializer="msgpack",
+    accept_content=['msgpack', 'json'],  # keep json while in-flight JSON tasks drain, then drop it
+    result_serializer='msgpack'
 )
 
 app = FastAPI()
@@ -37,7 +39,8 @@ def get_user_id(
     if x_user_id:
         return x_user_id
     if x_forwarded_for:
-        return x_forwarded_for.split(',')[0]  # First IP in chain
+        # First IP in chain - partition doesn't build a list of every hop
+        return x_forwarded_for.partition(',')[0].strip()
     return "anonymous"
 
 @app.post('/orders')
@@ -52,7 +55,7 @@ def create_order(
     order_limiter.check_or_raise(user_id)
     
     # Create order
-    order_id = str(uuid.uuid4())[:10]
+    order_id = secrets.token_hex(5)  # 10 hex chars, no UUID object + str + slice
     
     # Queue task
     task = app_celery.send_task(
@@ -103,13 +106,14 @@ def check_status(
 @app.get('/rate-limit/info')
 def rate_limit_info(user_id: str = Depends(get_user_id)):
     """Get rate limit info for user (debugging)"""
-    now = time.time()
+    now = monotonic()  # same clock as the limiter's timestamps
     cutoff = now - order_limiter.window_seconds
     
-    order_requests = order_limiter.user_requests.get(user_id, [])
+    # user_requests values are deques; .get() avoids creating an entry for unknown users
+    order_requests = order_limiter.user_requests.get(user_id, ())
     recent_orders = [ts for ts in order_requests if ts > cutoff]
     
-    status_requests = status_limiter.user_requests.get(user_id, [])
+    status_requests = status_limiter.user_requests.get(user_id, ())
     recent_status = [ts for ts in status_requests if ts > cutoff]
     
     return {
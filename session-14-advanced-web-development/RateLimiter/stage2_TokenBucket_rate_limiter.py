@@ -1,26 +1,47 @@
 # Stage 2: Token Bucket Rate Limiter (O(1) Performance)
-from collections import defaultdict
-from typing import Dict
-import time
+from collections import defaultdict, deque
+from typing import Deque, Dict
+import threading
+# monotonic: never jumps backwards when NTP adjusts the wall clock
+# (time.time() could make elapsed time negative); bound to a module-level
+# name so hot paths skip the time.<attr> lookup
+from time import monotonic as _now
 from fastapi import HTTPException
 
 class RateLimiter:
-    """Sliding window rate limiter - O(n) time complexity"""
+    """Sliding window rate limiter - O(n) memory, amortized O(1) per request"""
     def __init__(self, max_requests: int, window_seconds: int) -> None:
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.user_requests: Dict[str, list] = defaultdict(list)
+        self.user_requests: Dict[str, Deque[float]] = defaultdict(deque)
+        # Amortized sweep of idle users so the dict doesn't grow forever
+        self._calls = 0
+        self._gc_every = 10_000
+        # def endpoints run in a thread pool: check-and-update must be atomic
+        self._lock = threading.Lock()
     
     def allow_request(self, user_id: str) -> bool:
-        now = time.time()
-        requests = self.user_requests[user_id]
-        cutoff_time = now - self.window_seconds
-        requests[:] = [ts for ts in requests if ts > cutoff_time]
+        with self._lock:
+            now = _now()
+            self._calls += 1
+            if self._calls % self._gc_every == 0:
+                self._gc(now)
+            requests = self.user_requests[user_id]
+            cutoff_time = now - self.window_seconds
+            while requests and requests[0] <= cutoff_time:
+                requests.popleft()
         
-        if len(requests) < self.max_requests:
-            requests.append(now)
-            return True
-        return False
+            if len(requests) < self.max_requests:
+                requests.append(now)
+                return True
+            return False
+    
+    def _gc(self, now: float) -> None:
+        """Drop users with no requests left in the window"""
+        cutoff_time = now - self.window_seconds
+        for user_id, requests in list(self.user_requests.items()):
+            if not requests or requests[-1] <= cutoff_time:
+                del self.user_requests[user_id]
     
     def check_or_raise(self, user_id: str):
         if not self.allow_request(user_id):
@@ -31,6 +52,17 @@ class RateLimiter:
             )
 
 
+class _Bucket:
+    """Per-user bucket state: two floats
+    __slots__ = no per-instance __dict__: less memory than a
+    {'tokens': ..., 'last_refill': ...} dict and faster attribute access"""
+    __slots__ = ('tokens', 'last_refill')
+
+    def __init__(self, tokens: float, last_refill: float) -> None:
+        self.tokens = tokens
+        self.last_refill = last_refill
+
+
 class TokenBucketRateLimiter:
     """Token bucket rate limiter - O(1) time complexity"""
     def __init__(self, capacity: int, refill_rate: float) -> None:
@@ -40,56 +72,77 @@ class TokenBucketRateLimiter:
         """
         self.capacity = capacity
         self.refill_rate = refill_rate
-        self.user_buckets: Dict[str, Dict[str, float]] = {}
+        self.user_buckets: Dict[str, _Bucket] = {}
+        # Amortized sweep of idle users so the dict doesn't grow forever
+        self._calls = 0
+        self._gc_every = 10_000
+        # def endpoints run in a thread pool: check-and-update must be atomic
+        self._lock = threading.Lock()
     
-    def allow_request(self, user_id: str) -> bool:
-        """O(1) time complexity"""
-        now = time.time()
-        
-        # Initialize bucket for new user
-        if user_id not in self.user_buckets:
-            self.user_buckets[user_id] = {
-                'tokens': self.capacity,
-                'last_refill': now
-            }
-        
-        bucket = self.user_buckets[user_id]
-        
-        # Calculate tokens to add based on elapsed time
-        time_elapsed = now - bucket['last_refill']
+    def _refill(self, bucket: _Bucket, now: float) -> None:
+        """Add tokens for the time elapsed since last refill (up to capacity)"""
+        time_elapsed = now - bucket.last_refill
         tokens_to_add = time_elapsed * self.refill_rate
+        bucket.tokens = min(self.capacity, bucket.tokens + tokens_to_add)
+        bucket.last_refill = now
+    
+    def _consume(self, user_id: str) -> tuple[bool, float]:
+        """Refill, then try to take 1 token. Returns (allowed, tokens left) as seen
+        under the lock - bucket.tokens may already differ once it is released"""
+        with self._lock:
+            # read the clock under the lock so refills never see time go backwards
+            now = _now()
+            self._calls += 1
+            if self._calls % self._gc_every == 0:
+                self._gc(now)
+        
+            # Initialize bucket for new user (one dict lookup either way)
+            bucket = self.user_buckets.get(user_id)
+            if bucket is None:
+                bucket = self.user_buckets[user_id] = _Bucket(self.capacity, now)
         
-        # Refill bucket (up to capacity)
-        bucket['tokens'] = min(self.capacity, bucket['tokens'] + tokens_to_add)
-        bucket['last_refill'] = now
+            self._refill(bucket, now)
         
-        # Try to consume 1 token
-        if bucket['tokens'] >= 1:
-            bucket['tokens'] -= 1
-            return True
+            # Try to consume 1 token
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True, bucket.tokens
         
-        return False
+            return False, bucket.tokens
     
-    def check_or_raise(self, user_id: str):
-        """Check rate limit and raise HTTPException if exceeded"""
-        if not self.allow_request(user_id):
+    def allow_request(self, user_id: str) -> bool:
+        """O(1) time complexity"""
+        allowed, _ = self._consume(user_id)
+        return allowed
+    
+    def _gc(self, now: float) -> None:
+        """Drop buckets that have been idle long enough to refill completely.
+        A full bucket is exactly what a new user gets, so no state is lost."""
+        full_after = self.capacity / self.refill_rate
+        for user_id, bucket in list(self.user_buckets.items()):
+            if now - bucket.last_refill > full_after:
+                del self.user_buckets[user_id]
+    
+    def check_or_raise(self, user_id: str) -> float:
+        """Check rate limit and raise HTTPException if exceeded.
+        Returns the tokens left, so callers don't need get_info()"""
+        allowed, tokens = self._consume(user_id)
+        if not allowed:
             # Calculate retry after time
-            bucket = self.user_buckets.get(user_id)
-            if bucket:
-                time_to_token = (1 - bucket['tokens']) / self.refill_rate
-                retry_after = max(1, int(time_to_token))
-            else:
-                retry_after = 1
+            time_to_token = (1 - tokens) / self.refill_rate
+            retry_after = max(1, int(time_to_token))
             
             raise HTTPException(
                 status_code=429,
                 detail=f"Rate limit exceeded. Bucket capacity: {self.capacity}, refill rate: {self.refill_rate} tokens/sec",
                 headers={"Retry-After": str(retry_after)}
             )
+        return tokens
     
     def get_info(self, user_id: str) -> dict:
-        """Get rate limit info for debugging"""
-        if user_id not in self.user_buckets:
+        """Get rate limit info for debugging (read only - does not consume a token)"""
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
             return {
                 'tokens': self.capacity,
                 'capacity': self.capacity,
@@ -97,11 +150,11 @@ class TokenBucketRateLimiter:
             }
         
         # Update tokens before returning info
-        self.allow_request(user_id)  # This updates tokens
-        bucket = self.user_buckets[user_id]
+        with self._lock:
+            self._refill(bucket, _now())
         
         return {
-            'tokens': bucket['tokens'],
+            'tokens': bucket.tokens,
             'capacity': self.capacity,
             'refill_rate': self.refill_rate
-        }
\ No newline at end of file
+        }
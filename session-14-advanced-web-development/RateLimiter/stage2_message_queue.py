@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Depends, Header
 from stage2_TokenBucket_rate_limiter import TokenBucketRateLimiter
-import uuid
+import secrets
 
 app = FastAPI()
 
@@ -20,22 +20,20 @@ def create_order(
     user_id: str = Depends(get_user_id)
 ):
     """Create order with token bucket rate limiting"""
-    order_limiter.check_or_raise(user_id)
+    # check_or_raise returns the tokens left - no get_info() call needed
+    remaining_tokens = order_limiter.check_or_raise(user_id)
     
-    order_id = str(uuid.uuid4())[:10]
+    order_id = secrets.token_hex(5)  # 10 hex chars, no UUID object + str + slice
     task = app_celery.send_task('process_order', args=[order_id, customer, amount])
     
-    # Get current token info for response headers
-    token_info = order_limiter.get_info(user_id)
-    
     return {
         'status': 'processing',
         'order_id': order_id,
         'task_id': task.id,
         'rate_limit_info': {
-            'remaining_tokens': int(token_info['tokens']),
-            'capacity': token_info['capacity'],
-            'refill_rate': token_info['refill_rate']
+            'remaining_tokens': int(remaining_tokens),
+            'capacity': order_limiter.capacity,
+            'refill_rate': order_limiter.refill_rate
         }
     }
 
@@ -10,9 +10,10 @@ app_celery = Celery(
 )
 
 app_celery.conf.update(
-    task_serializer="json",
-    accept_content=['json'],  # Ignore other content
-    result_serializer='json'
+    # msgpack: smaller task/result bodies than JSON and faster to (de)serialize (pip install msgpack)
+    task_serializer="msgpack",
+    accept_content=['msgpack', 'json'],  # keep json while in-flight JSON tasks drain, then drop it
+    result_serializer='msgpack'
 )
 
 redis_client = redis.Redis(host="localhost", port=6379, decode_responses=True)  # Redis for Idempotency Checking
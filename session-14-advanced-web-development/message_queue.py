@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from celery import Celery
-import uuid
+from celery.utils import uuid
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import secrets
 # from .message_consumer import process_order
 from celery.result import AsyncResult  
 
@@ -12,31 +16,116 @@ app_celery = Celery(
 )
 
 app_celery.conf.update(
-    task_serializer="json",
-    accept_content=['json'],  # Ignore other content
-    result_serializer='json'
+    # msgpack: smaller task/result bodies than JSON and faster to (de)serialize (pip install msgpack)
+    task_serializer="msgpack",
+    accept_content=['msgpack', 'json'],  # keep json while in-flight JSON tasks drain, then drop it
+    result_serializer='msgpack'
 )
 
-app = FastAPI()
+# Batch publishing: requests put orders on an in-memory queue, a background
+# task sends them to RabbitMQ in batches over one pooled producer (one channel)
+# instead of one send_task round trip per request. Each request waits on its
+# own future, resolved once its batch is published, so a task_id is never
+# returned for an order that only exists in this process's memory.
+FLUSH_INTERVAL = 0.01   # seconds to wait for more orders before sending a batch
+MAX_BATCH = 100
+RETRY_DELAY = 1.0       # seconds between attempts when the broker is unreachable
+SHUTDOWN_TIMEOUT = 10.0  # seconds to flush queued orders on shutdown
+
+logger = logging.getLogger(__name__)
+
+order_queue: asyncio.Queue = asyncio.Queue()  # (future, order) items; None = flush and stop
+
+
+def send_batch(batch):
+    """Runs in a worker thread: publishing is blocking network I/O"""
+    with app_celery.producer_or_acquire() as producer:
+        for _, (task_id, order_id, customer, amount) in batch:
+            # Send task by name (no import needed!)
+            app_celery.send_task(
+                'process_order',  # Must match task name in message_consumer.py
+                args=[order_id, customer, amount],
+                task_id=task_id,
+                producer=producer,
+            )
+
+
+async def send_with_retry(batch):
+    """A failed batch is retried, not dropped: an exception must not kill the publisher"""
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(send_batch, batch)
+                break
+            except Exception:
+                logger.exception("Publishing %d orders failed, retrying in %.1fs", len(batch), RETRY_DELAY)
+                await asyncio.sleep(RETRY_DELAY)
+    except asyncio.CancelledError:  # shutdown timed out: fail the waiting requests
+        fail_orders(batch)
+        raise
+    for published, _ in batch:
+        if not published.done():  # the request may have been cancelled meanwhile
+            published.set_result(None)
+
+
+def fail_orders(items):
+    for published, _ in items:
+        if not published.done():
+            published.set_exception(RuntimeError("order was not published"))
+
+
+async def publish_orders():
+    while True:
+        item = await order_queue.get()
+        if item is None:
+            return
+        batch = [item]
+        await asyncio.sleep(FLUSH_INTERVAL)   # let a burst accumulate
+        stop = False
+        while len(batch) < MAX_BATCH and not order_queue.empty():
+            item = order_queue.get_nowait()
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        await send_with_retry(batch)
+        if stop:
+            return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    publisher = asyncio.create_task(publish_orders())
+    yield
+    # FIFO: every order queued before the marker is published before the task ends
+    await order_queue.put(None)
+    try:
+        await asyncio.wait_for(publisher, SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:  # broker still down: give up (wait_for cancels the task)
+        logger.error("Shutdown: %d queued orders were not published", order_queue.qsize())
+        fail_orders(item for item in (order_queue.get_nowait() for _ in range(order_queue.qsize())) if item)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post('/orders')
-def create_order(customer: str, amount: float):
-    order_id = str(uuid.uuid4())[:10]
+async def create_order(customer: str, amount: float):
+    order_id = secrets.token_hex(5)  # 10 hex chars, no UUID object + str + slice
     # result = process_order(order_id, customer, amount)
     # return result
     # task = process_order.delay(order_id, customer, amount)
 
-    # Send task by name (no import needed!)
-    task = app_celery.send_task(
-        'process_order',  # Must match task name in message_consumer.py
-        args=[order_id, customer, amount]
-    )
+    # Pick the task id here; respond only after the batch carrying it is published
+    task_id = uuid()
+    published = asyncio.get_running_loop().create_future()
+    await order_queue.put((published, (task_id, order_id, customer, amount)))
+    await published
     
     return {
         'status': 'processing',
         'order_id': order_id,
-        'task_id': task.id
+        'task_id': task_id
     }
     
 @app.get('/orders/{task_id}/status')
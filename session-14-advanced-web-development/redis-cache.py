@@ -1,26 +1,89 @@
 import redis
+from collections import OrderedDict
 from functools import wraps
 import time
-import json
+import orjson  # ~5x faster than json for dict/list payloads
+import hashlib
 
 redis_client = redis.Redis(host="localhost", port=6379, decode_responses=True)
 
-def cache(ttl=3600):
+
+class TTLDict:
+    """Small process-local LRU with expiry, in front of Redis.
+    Hot keys are served without a network round trip for up to `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)  # mark as recently used
+        return value
+
+    def set(self, key, value):
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)  # evict least recently used
+
+
+def _key_default(obj):
+    # sets iterate in hash order (randomized per process for str), so sort them
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"unhashable cache argument: {type(obj).__name__}")
+
+
+def cache(ttl=3600, local_ttl=1.0, local_maxsize=1024):
     def decorator(func):
+        # never keep a value locally longer than in Redis
+        local = TTLDict(maxsize=local_maxsize, ttl=min(local_ttl, ttl))
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}:{args}:{kwargs}"
+            # f"{func.__name__}:{args}:{kwargs}" repr()s every argument and the
+            # key grows with them; a 16-byte BLAKE2b digest keeps keys small and fixed-size.
+            # orjson with sorted keys is deterministic across processes, unlike pickle
+            try:
+                payload = orjson.dumps(
+                    [func.__module__, func.__qualname__, args, kwargs],
+                    default=_key_default,
+                    option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                )
+            except TypeError:
+                print('[Cache SKIP]')  # no stable key for these arguments
+                return func(*args, **kwargs)
+            cache_key = 'c:' + hashlib.blake2b(payload, digest_size=16).hexdigest()
             
+            # 1. process memory (stores the JSON, so callers get a fresh object)
+            cached = local.get(cache_key)
+            if cached is not None:
+                print('[Local HIT]')
+                return orjson.loads(cached)
+
+            # 2. Redis
             cached = redis_client.get(cache_key)
             
             if cached:
+                local.set(cache_key, cached)
                 print('[Cache HIT]')
-                return json.loads(cached)
+                return orjson.loads(cached)  # accepts the str from decode_responses=True
 
             print('[Cache MISS]')
             result = func(*args, **kwargs)
             
-            redis_client.set(cache_key, json.dumps(result), ttl)
+            # ex= explicitly: SET key value EX ttl in one command
+            value = orjson.dumps(result)
+            redis_client.set(cache_key, value, ex=ttl)
+            local.set(cache_key, value)
             
             return result
             
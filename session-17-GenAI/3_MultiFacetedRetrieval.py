@@ -5,20 +5,73 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
-
-# Load PDF
-loader = PyPDFLoader("TSLA-Q2-2025-Update.pdf")
-pdf_pages = loader.load()
-
-# Chunk
-splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-chunks = splitter.split_documents(pdf_pages)
-
-# Create vector store
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-vectorstore = FAISS.from_documents(chunks, embeddings)
+import mmap
+import os
+import sys
+import threading
+import time
+import faiss
+import numpy as np
+
+try:
+    import hnswlib  # pip install hnswlib - optional ANN index for ScoredMultiFacetedRetriever
+except ImportError:
+    hnswlib = None
+
+try:
+    from numba import njit, prange  # pip install numba - optional int8 scoring kernel
+except ImportError:
+    njit = None
+
+PDF_PATH = "TSLA-Q2-2025-Update.pdf"
+CHUNK_SIZE, CHUNK_OVERLAP = 1000, 200
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Saved LangChain store, plus the ScoredMultiFacetedRetriever files built from it
+VECTORSTORE_DIR = "tsla_faiss_store"
+
+
+def _source_fingerprint() -> str:
+    """What the saved store was built from: PDF bytes, chunking and embedding model"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(PDF_PATH, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"{CHUNK_SIZE}:{CHUNK_OVERLAP}:{EMBEDDING_MODEL}".encode())
+    return digest.hexdigest()
+
+
+embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+source_path = os.path.join(VECTORSTORE_DIR, "source.txt")
+fingerprint = _source_fingerprint()
+try:
+    with open(source_path) as f:
+        saved_fingerprint = f.read()
+except OSError:
+    saved_fingerprint = None
+
+if saved_fingerprint == fingerprint:
+    # Cold start without re-embedding the PDF (the pickle is our own save_local output)
+    vectorstore = FAISS.load_local(VECTORSTORE_DIR, embeddings, allow_dangerous_deserialization=True)
+else:
+    # Load PDF
+    loader = PyPDFLoader(PDF_PATH)
+    pdf_pages = loader.load()
+    
+    # Chunk
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents(pdf_pages)
+    
+    # Create vector store
+    vectorstore = FAISS.from_documents(chunks, embeddings)
+    vectorstore.save_local(VECTORSTORE_DIR)
+    with open(source_path, "w") as f:
+        f.write(fingerprint)  # written last: a crash mid-save forces a rebuild
 retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
 # Initialize LLM
@@ -248,37 +301,515 @@ print_results(results)
 # 5. Hybrid Retrieval with Scoring
 # ============================================================
 
+# newlines/tabs -> spaces in one C-level pass (vs chained str.replace)
+_WS_TABLE = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first - O(N + k log k) instead of a full sort"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k)[:k]  # unordered top-k
+    return top[np.argsort(-scores[top])]   # sort only the k survivors
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _score_int8(Xq, qs, out):
+        # Rows split across cores; the inner int8 * float32 loop auto-vectorizes (FMA)
+        for i in prange(Xq.shape[0]):
+            s = np.float32(0.0)
+            for j in range(Xq.shape[1]):
+                s += Xq[i, j] * qs[j]
+            out[i] = s
+else:
+    _score_int8 = None
+
+_int8_kernels = {}  # dim -> compiled kernel
+
+
+def _specialize_int8_kernel(dim: int):
+    """Compile _score_int8 for a fixed dim, once per dim; falls back to the generic kernel"""
+    if _score_int8 is None:
+        return None
+    if dim not in _int8_kernels:
+        n_dim = int(dim)
+        
+        # Same kernel with the embedding dimension as a closure constant: Numba freezes
+        # it into the compiled code, and a constant trip count lets LLVM fully
+        # unroll/vectorize the inner loop with no remainder handling
+        def score(Xq, qs, out):
+            for i in prange(Xq.shape[0]):
+                s = np.float32(0.0)
+                for j in range(n_dim):
+                    s += Xq[i, j] * qs[j]
+                out[i] = s
+        
+        try:
+            kernel = njit(parallel=True, fastmath=True)(score)
+            kernel(np.zeros((1, n_dim), np.int8), np.zeros(n_dim, np.float32), np.empty(1, np.float32))
+        except Exception:
+            kernel = _score_int8  # Numba compiles lazily: a failure shows up on the first call
+        _int8_kernels[dim] = kernel
+    return _int8_kernels[dim]
+
+
+@dataclass(slots=True)
+class ScoredDoc:
+    """One retrieval hit - slots: no per-instance __dict__, ~4x smaller than a dict"""
+    document: Any
+    semantic_score: float
+    page: Optional[str]
+    source: Optional[str]
+
+
+class QueryCache:
+    """Thread-safe LRU with expiry: a repeated query becomes a dict lookup"""
+    
+    def __init__(self, maxsize: int = 2000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+    
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item[0] >= time.monotonic():
+                self.data.move_to_end(key)  # mark as recently used
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self.data[key]  # expired
+            self.misses += 1
+            return None
+    
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)  # evict least recently used
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "size": len(self.data)}
+
+
 class ScoredMultiFacetedRetriever(MultiFacetedRetriever):
     
-    def retrieve_with_scores(self, query: str, k: int = 5) -> List[Dict]:
-        """Retrieve and combine scores from multiple methods"""
+    def __init__(self, vectorstore, llm, index_path: Optional[str] = None, matrix_path: Optional[str] = None,
+                 store_dir: str = VECTORSTORE_DIR, ef_search: int = 64, ann_threshold: int = 10_000,
+                 quantize: bool = False,
+                 rerank_k: int = 256, use_gpu: bool = True):
+        super().__init__(vectorstore, llm)
+        # Sidecar files live next to the saved store, not in the CWD
+        os.makedirs(store_dir, exist_ok=True)
+        self.index_path = index_path or os.path.join(store_dir, "hnsw.bin")
+        self.matrix_path = matrix_path = matrix_path or os.path.join(store_dir, "emb.npy")
+        stem = os.path.splitext(matrix_path)[0]
+        self.meta_path = stem + ".meta.npz"
+        self.header_path = stem + ".json"  # what the files on disk were built from
+        self.ef_search = ef_search  # HNSW search breadth: higher = better recall, slower
+        self.ann_threshold = ann_threshold
+        self.quantize = quantize
+        self.use_gpu = use_gpu      # large corpora: exact search on the GPU when faiss-gpu is installed
+        self.rerank_k = rerank_k    # int8 shortlist size re-scored in float32
+        self.cache = QueryCache(maxsize=2000, ttl=300)
+        self._query_embed_cache = QueryCache(maxsize=10_000, ttl=float("inf"))
+        self._docs = []             # row i of the matrix -> Document
+        self._meta = None           # row i -> (page, source) as columns; "" = missing
+        self._matrix = None         # (N, D) float32, rows L2-normalized, memory-mapped
+        self._qmatrix = None        # (N, D) int8 copy, X ~= Xq * scale
+        self._scale = None          # (D,) float32 per-dimension scale
+        self._int8_kernel = None    # Numba kernel compiled for this D
+        self._hnsw = None
+        self._gpu_index = None
+        self._from_disk = False     # matrix/meta reused from a previous run
+        self._reindex()
+    
+    def _reindex(self):
+        # FAISS.from_documents builds a flat index we can read the vectors back from.
+        # Small corpora: one exact BLAS scan over the matrix beats any ANN index.
+        # Large corpora: exact search on a GPU if there is one, else copy the vectors
+        # into an HNSW graph once -> ~O(log N) search.
+        self._qmatrix = self._hnsw = self._gpu_index = None
+        if hasattr(self.vectorstore, "index"):
+            self._load_matrix()
+            if self.quantize:
+                self._quantize()
+            if len(self._docs) >= self.ann_threshold:
+                if self.use_gpu and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+                    self._build_gpu_index()
+                elif hnswlib is not None:
+                    self._build_hnsw()
+            self._advise_matrix()
+        self.cache.clear()  # cached results may reference stale rows
+    
+    def add_documents(self, documents, **kwargs):
+        ids = self.vectorstore.add_documents(documents, **kwargs)
+        self._reindex()
+        return ids
+    
+    def delete(self, ids):
+        result = self.vectorstore.delete(ids)
+        self._reindex()
+        return result
+    
+    def _load_matrix(self):
+        faiss_index = self.vectorstore.index
+        n = faiss_index.ntotal
+        self._docs = [
+            self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[i])
+            for i in range(n)
+        ]
         
-        # Get results with scores
-        semantic_results = self.vectorstore.similarity_search_with_score(query, k=k)
+        header = self._header()
+        self._from_disk = self._read_header() == header
+        if self._from_disk:
+            # Same vectors as a previous run: map the saved files, skip the rebuild
+            self._matrix = np.load(self.matrix_path, mmap_mode="r")
+            self._meta = np.load(self.meta_path)["meta"].view(np.recarray)
+            return
         
-        # Normalize and combine
-        scored_docs = []
+        if os.path.exists(self.header_path):
+            os.remove(self.header_path)  # a crash mid-write must not leave a valid header
         
-        for doc, score in semantic_results:
-            scored_docs.append({
-                "document": doc,
-                "semantic_score": 1 - score,  # Convert distance to similarity
-                "page": doc.metadata.get("page_label"),
-                "source": doc.metadata.get("source")
-            })
+        self._meta = np.rec.fromarrays(
+            [
+                np.array([str(doc.metadata.get("page_label", "")) for doc in self._docs], dtype=str),
+                np.array([str(doc.metadata.get("source", "")) for doc in self._docs], dtype=str),
+            ],
+            names="page,source"
+        )
+        np.savez(self.meta_path, meta=self._meta)
+        X = faiss_index.reconstruct_n(0, n)
+        # Normalize once at ingest: every backend below (BLAS scan, int8, IndexFlatIP,
+        # HNSW 'ip') then scores cosine as a plain dot product, no per-query norms
+        X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)  # guard empty vectors
         
-        # Sort by score
-        scored_docs.sort(key=lambda x: x["semantic_score"], reverse=True)
+        # Serve the matrix from a memory-mapped .npy: pages live in the OS page cache,
+        # shared by every process that maps the file, instead of private heap copies.
+        # Write-then-rename so an older mapping of the file is never truncated under us.
+        tmp_path = self.matrix_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, X)
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode="r")
         
-        return scored_docs
+        with open(self.header_path, "w") as f:
+            json.dump(header, f)
+    
+    def _header(self) -> Dict:
+        # Saved files are valid only for the same dimension, embedding model and rows.
+        # Rows are fingerprinted by content: docstore ids are fresh uuid4s on every
+        # from_documents, so they would never match across runs
+        faiss_index = self.vectorstore.index
+        embedder = self.vectorstore.embeddings
+        embedder_id = f"{type(embedder).__name__}:{getattr(embedder, 'model', '')}"
+        content = hashlib.blake2b(digest_size=16)
+        for doc in self._docs:  # row order
+            content.update(doc.page_content.encode())
+            content.update(b"\0")
+        return {
+            "version": 2,
+            "dim": faiss_index.d,
+            "n": faiss_index.ntotal,
+            "embedder_fingerprint": hashlib.blake2b(embedder_id.encode(), digest_size=16).hexdigest(),
+            "content_fingerprint": content.hexdigest()
+        }
+    
+    def _read_header(self):
+        try:
+            with open(self.header_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
     
-    def print_scored_results(self, results: List[Dict]):
-        print(f"{'Rank':<6}{'Score':<10}{'Page':<8}{'Content Preview'}")
-        print("-" * 70)
+    def _advise_matrix(self):
+        m = getattr(self._matrix, "_mmap", None)
+        if m is None or not hasattr(mmap, "MADV_WILLNEED"):  # madvise is Linux/BSD only
+            return
+        m.madvise(mmap.MADV_WILLNEED)  # pre-warm: start reading the file in now
+        if self._hnsw is None and self._qmatrix is None:
+            # Every query is a front-to-back scan: let the kernel read ahead aggressively
+            m.madvise(mmap.MADV_SEQUENTIAL)
+    
+    def _scan(self, Q: np.ndarray, block: int = 1024) -> np.ndarray:
+        """Q @ X.T in row blocks, asking the kernel for block b+1 while block b is scored"""
+        m = getattr(self._matrix, "_mmap", None)
+        n, dim = self._matrix.shape
+        if m is None or not hasattr(mmap, "MADV_WILLNEED") or n <= block:
+            return Q @ self._matrix.T
+        
+        row_bytes = dim * self._matrix.itemsize
+        base = self._matrix.offset % mmap.ALLOCATIONGRANULARITY  # array start inside the mapping
+        S = np.empty((len(Q), n), dtype=np.float32)
+        for start in range(0, n, block):
+            nxt = start + block
+            if nxt < n:
+                # Pages not yet resident get read in the background: the next block's
+                # page faults overlap with this block's GEMM instead of stalling it
+                lo = (base + nxt * row_bytes) // mmap.PAGESIZE * mmap.PAGESIZE  # page-aligned
+                hi = base + min(nxt + block, n) * row_bytes
+                m.madvise(mmap.MADV_WILLNEED, lo, hi - lo)
+            S[:, start:nxt] = Q @ self._matrix[start:nxt].T
+        return S
+    
+    def _quantize(self):
+        # Symmetric per-dimension int8: 4x fewer bytes streamed per scan than float32
+        scale = np.abs(self._matrix).max(axis=0) / 127
+        scale[scale == 0] = 1
+        self._scale = scale.astype(np.float32)
+        self._qmatrix = np.round(self._matrix / self._scale).astype(np.int8)
+        self._int8_kernel = _specialize_int8_kernel(self._qmatrix.shape[1])
+    
+    def _scan_int8(self, Xq: np.ndarray, q: np.ndarray, block: int = 4096) -> np.ndarray:
+        # Xq @ (scale * q) == X @ q up to rounding. NumPy has no int8 BLAS, so upcast
+        # one cache-sized block at a time instead of materializing a float32 copy.
+        qs = self._scale * q
+        scores = np.empty(len(Xq), dtype=np.float32)
+        if self._int8_kernel is not None:
+            self._int8_kernel(Xq, qs, scores)  # compiled: reads int8 directly, no upcast copies
+            return scores
+        for start in range(0, len(scores), block):
+            scores[start:start + block] = Xq[start:start + block].astype(np.float32) @ qs
+        return scores
+    
+    def _build_gpu_index(self):
+        # Rows are unit length, so inner product == cosine similarity
+        self._gpu_res = faiss.StandardGpuResources()  # keep alive as long as the index
+        index = faiss.index_cpu_to_gpu(self._gpu_res, 0, faiss.IndexFlatIP(self._matrix.shape[1]))
+        index.add(np.ascontiguousarray(self._matrix))
+        self._gpu_index = index
+    
+    def _build_hnsw(self):
+        n, dim = self._matrix.shape
+        # Rows are already unit length: 'ip' skips the re-normalizing copy 'cosine' makes
+        index = hnswlib.Index(space="ip", dim=dim)
+        if self._from_disk and os.path.exists(self.index_path):
+            # Saved by a previous run over the same vectors: skip the rebuild
+            index.load_index(self.index_path, max_elements=n)
+        if index.get_current_count() != n:
+            index = hnswlib.Index(space="ip", dim=dim)
+            index.init_index(max_elements=n, M=32, ef_construction=200)
+            index.add_items(self._matrix, np.arange(n))
+            index.save_index(self.index_path)
+        self._hnsw = index
+    
+    def _embed(self, query: str) -> np.ndarray:
+        # The embedding call is the most expensive step and deterministic per string,
+        # so it is cached separately from results: a new k still skips the model
+        q = self._query_embed_cache.get(query)
+        if q is None:
+            q = np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.float32)
+            q /= max(np.linalg.norm(q), 1e-12)  # guard empty vectors
+            q.flags.writeable = False  # shared between calls
+            self._query_embed_cache.set(query, q)
+        return q
+    
+    @staticmethod
+    def _cache_key(query: str, k: int, filter: Dict = None):
+        return (
+            hashlib.blake2b(query.encode(), digest_size=16).digest(),
+            k,
+            json.dumps(filter, sort_keys=True, default=str) if filter else None
+        )
+    
+    def retrieve_with_scores(self, query: str, k: int = 5, filter: Dict = None) -> List[ScoredDoc]:
+        """Retrieve and combine scores from multiple methods.
+        filter: {"page": ..., "source": ...}, each a value or a list of allowed values"""
         
-        for i, r in enumerate(results, 1):
-            content = r["document"].page_content[:50].replace("\n", " ")
-            print(f"{i:<6}{r['semantic_score']:.4f}    {r['page']:<8}{content}...")
+        key = self._cache_key(query, k, filter)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)  # copy: callers may reorder or trim their list
+        
+        scored_docs = self._search(query, k, filter)
+        self.cache.set(key, scored_docs)
+        return list(scored_docs)
+    
+    def retrieve_batch(self, queries: List[str], k: int = 5, filter: Dict = None) -> List[List[ScoredDoc]]:
+        """Retrieve for several queries at once: one embedding call and one GEMM for all cache misses"""
+        
+        keys = [self._cache_key(query, k, filter) for query in queries]
+        results = [self.cache.get(key) for key in keys]
+        misses = [i for i, r in enumerate(results) if r is None]
+        
+        if misses:
+            miss_queries = [queries[i] for i in misses]
+            if self._matrix is not None:
+                fresh = self._search_matrix(self._embed_batch(miss_queries), k, filter)
+            else:
+                # No matrix to multiply against: overlap the store's per-query calls instead
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    fresh = list(pool.map(lambda query: self._search(query, k, filter), miss_queries))
+            for i, scored_docs in zip(misses, fresh):
+                self.cache.set(keys[i], scored_docs)
+                results[i] = scored_docs
+        
+        return [list(r) for r in results]
+    
+    def _embed_batch(self, queries: List[str]) -> np.ndarray:
+        Q = np.empty((len(queries), self._matrix.shape[1]), dtype=np.float32)
+        todo = []
+        for row, query in enumerate(queries):
+            q = self._query_embed_cache.get(query)
+            if q is None:
+                todo.append(row)
+            else:
+                Q[row] = q
+        
+        if todo:
+            # One model call for every uncached query (same vectors as embed_query for OpenAI)
+            E = np.asarray(
+                self.vectorstore.embeddings.embed_documents([queries[row] for row in todo]),
+                dtype=np.float32
+            )
+            E /= np.maximum(np.linalg.norm(E, axis=1, keepdims=True), 1e-12)
+            E.flags.writeable = False  # rows are shared through the cache
+            Q[todo] = E
+            for row, q in zip(todo, E):
+                self._query_embed_cache.set(queries[row], q)
+        return Q
+    
+    def _filter_mask(self, filter: Dict) -> np.ndarray:
+        # Pre-filter: rows failing the filter are never scored, instead of being
+        # scored and then dropped by the caller
+        mask = np.ones(len(self._docs), dtype=bool)
+        for field, values in filter.items():
+            allowed = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            mask &= np.isin(self._meta[field], np.array(allowed, dtype=str))
+        return mask
+    
+    def _rerank_int8(self, q: np.ndarray, k: int, rows: np.ndarray = None):
+        # Coarse int8 shortlist, then exact float32 rerank of the survivors
+        Xq = self._qmatrix if rows is None else self._qmatrix[rows]
+        candidates = _top_k(self._scan_int8(Xq, q), max(self.rerank_k, k))
+        if rows is not None:
+            candidates = rows[candidates]  # subset position -> matrix row
+        scores = self._matrix[candidates] @ q
+        order = _top_k(scores, k)
+        return candidates[order], scores[order]
+    
+    def _search_matrix(self, Q: np.ndarray, k: int, filter: Dict = None) -> List[List[ScoredDoc]]:
+        """Top-k for every row of Q (M, D) - M=1 for a single query"""
+        mask = rows = None
+        if filter:
+            mask = self._filter_mask(filter)
+            rows = np.flatnonzero(mask)
+        k = min(k, len(self._docs) if rows is None else len(rows))
+        if k == 0:
+            return [[] for _ in Q]
+        
+        hits = None
+        if self._gpu_index is not None and mask is None:
+            # One batched GPU GEMM + top-k; throughput scales with the number of queries
+            scores, labels = self._gpu_index.search(np.ascontiguousarray(Q), k)
+            hits = zip(labels, scores)
+        elif self._hnsw is not None:
+            self._hnsw.set_ef(max(self.ef_search, k))  # ef must be >= k
+            try:
+                if mask is None:
+                    labels, distances = self._hnsw.knn_query(Q, k=k)
+                else:
+                    # Filtered graph walk; hnswlib only supports filters single-threaded
+                    labels, distances = self._hnsw.knn_query(
+                        Q, k=k, num_threads=1, filter=lambda label: bool(mask[label])
+                    )
+                # knn_query returns results nearest first, already sorted
+                hits = zip(labels, 1 - distances)  # ip distance = 1 - dot -> similarity
+            except RuntimeError:
+                # The walk reached fewer than k rows passing a selective filter:
+                # fall through to the exact scan of the allowed subset below
+                pass
+        
+        if hits is None and self._qmatrix is not None:
+            hits = [self._rerank_int8(q, k, rows) for q in Q]
+        elif hits is None:
+            # Score only the allowed subset: cost shrinks with the filter's selectivity
+            # (filtered queries land here too when the GPU index is in use)
+            S = self._scan(Q) if rows is None else Q @ self._matrix[rows].T  # = cosine similarity
+            tops = [_top_k(row, k) for row in S]
+            hits = [(top if rows is None else rows[top], row[top]) for top, row in zip(tops, S)]
+        
+        # Build results for the k survivors only. page/source are gathered from the
+        # metadata columns in one fancy-index each, not two dict lookups per Document.
+        results = []
+        for top, scores in hits:
+            meta = self._meta[top]
+            results.append([
+                ScoredDoc(self._docs[i], score, page or None, source or None)
+                for i, score, page, source in zip(
+                    top.tolist(), scores.tolist(), meta.page.tolist(), meta.source.tolist()
+                )
+            ])
+        return results
+    
+    def _search(self, query: str, k: int, filter: Dict = None) -> List[ScoredDoc]:
+        if self._matrix is not None:
+            return self._search_matrix(self._embed(query)[None, :], k, filter)[0]
+        
+        # Let the store filter with its own metadata keys
+        store_filter = None
+        if filter:
+            store_filter = {
+                ("page_label" if field == "page" else field): values
+                for field, values in filter.items()
+            }
+        
+        # Get results with scores
+        if hasattr(self.vectorstore, "similarity_search_with_score_by_vector"):
+            q_vec = self._embed(query).tolist()
+            semantic_results = self.vectorstore.similarity_search_with_score_by_vector(
+                q_vec, k=k, filter=store_filter
+            )
+        else:
+            semantic_results = self.vectorstore.similarity_search_with_score(
+                query, k=k, filter=store_filter
+            )
+        
+        # Same cosine similarity as the matrix/HNSW paths, in one float array
+        scores = self._store_scores_to_cosine(np.fromiter(
+            (score for _, score in semantic_results),
+            dtype=np.float32, count=len(semantic_results)
+        ))
+        
+        # Rank with argpartition, not list.sort(key=lambda ...): no per-element
+        # Python callback, and only the top k get sorted
+        scored_docs = []
+        for i in _top_k(scores, k):
+            doc = semantic_results[i][0]
+            scored_docs.append(ScoredDoc(
+                doc, float(scores[i]), doc.metadata.get("page_label"), doc.metadata.get("source")
+            ))
+        
+        return scored_docs
+    
+    def _store_scores_to_cosine(self, scores: np.ndarray) -> np.ndarray:
+        """The store's raw scores as cosine similarity (embeddings are unit length).
+        LangChain FAISS returns squared L2 distance by default: |a - b|^2 = 2 - 2 cos"""
+        strategy = getattr(self.vectorstore, "distance_strategy", "EUCLIDEAN_DISTANCE")
+        if getattr(strategy, "value", strategy) in ("MAX_INNER_PRODUCT", "DOT_PRODUCT"):
+            return scores  # already the dot product
+        return 1 - scores / 2
+    
+    def print_scored_results(self, results: List[ScoredDoc]):
+        lines = [f"{'Rank':<6}{'Score':<10}{'Page':<8}{'Content Preview'}", "-" * 70]
+        lines += [
+            f"{i:<6}{r.semantic_score:<10.4f}{str(r.page):<8}"
+            f"{r.document.page_content[:50].translate(_WS_TABLE)}..."
+            for i, r in enumerate(results, 1)
+        ]
+        # One write (one stdout lock/flush) instead of a print per row
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 # Usage
@@ -287,4 +818,12 @@ scored_results = scored_retriever.retrieve_with_scores(
     "Tesla deliveries Q2 2025", 
     k=5
 )
-scored_retriever.print_scored_results(scored_results)
\ No newline at end of file
+scored_retriever.print_scored_results(scored_results)
+
+# Several queries at once: one embedding call + one matrix multiply
+batch_results = scored_retriever.retrieve_batch(
+    ["Tesla deliveries Q2 2025", "Energy storage deployments", "Free cash flow"],
+    k=3
+)
+for results in batch_results:
+    scored_retriever.print_scored_results(results)
@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime, timedelta
+from sqlalchemy import select, insert
+from datetime import datetime
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
+import asyncio
+import base64
+import bcrypt
+import hashlib
+import time
 
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.cache import LRUCache
 from app.models.models import User
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
 
@@ -36,23 +40,116 @@ class Token(BaseModel):
     token_type: str
 
 
+# bcrypt directly (C core), without passlib's per-call scheme dispatch.
+# Produces/accepts the same $2b$ hashes passlib stored.
+# Both take 100s of ms at cost 12: call them through asyncio.to_thread so the event
+# loop keeps serving other requests (the C extension releases the GIL while hashing).
+#
+# Passwords are pre-hashed with SHA-256 (base64, 44 bytes): bcrypt silently ignores
+# input past 72 bytes, and the pre-hash costs microseconds next to bcrypt itself.
+PREHASH_PREFIX = "$sha256"  # marks bcrypt(base64(sha256(password))) hashes
+BCRYPT_COST = getattr(settings, "BCRYPT_COST", 12)  # default for settings without it
+
+
+def _prehash(password: str) -> bytes:
+    return base64.b64encode(hashlib.sha256(password.encode()).digest())
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith(PREHASH_PREFIX):
+        return bcrypt.checkpw(_prehash(plain_password), hashed_password[len(PREHASH_PREFIX):].encode())
+    # Legacy hash of the raw password
+    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    salt = bcrypt.gensalt(rounds=BCRYPT_COST)
+    return PREHASH_PREFIX + bcrypt.hashpw(_prehash(password), salt).decode()
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Legacy scheme, or a cost other than the configured BCRYPT_COST"""
+    if not hashed_password.startswith(PREHASH_PREFIX):
+        return True
+    cost = int(hashed_password[len(PREHASH_PREFIX):].split("$")[2])  # $2b$<cost>$...
+    return cost != BCRYPT_COST
+
+
+# Compared against when the username doesn't exist, so a miss costs the same
+# bcrypt time as a wrong password (no user enumeration via response timing)
+DUMMY_HASH = get_password_hash("dummy-password")
+
+LOGIN_RATE_LIMIT = 10   # login attempts per client IP ...
+LOGIN_RATE_WINDOW = 60  # ... per this many seconds; bounds the bcrypt CPU one client can force
+
+# INCR + EXPIRE in one atomic step: a key can never be left without a TTL
+# (which would lock that IP out for good)
+LOGIN_RATE_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# Reverse proxies in front of the app that append to X-Forwarded-For. 0 = clients
+# connect directly and the header is ignored (anyone can send it)
+TRUSTED_PROXY_HOPS = getattr(settings, "TRUSTED_PROXY_HOPS", 0)
+
+
+def client_ip(request: Request) -> str:
+    """The caller's address: the hop the nearest trusted proxy saw, else the socket peer"""
+    if TRUSTED_PROXY_HOPS:
+        hops = request.headers.get("x-forwarded-for", "").split(",")
+        # Entries left of the trusted proxies' own are client-controlled
+        if len(hops) >= TRUSTED_PROXY_HOPS and hops[-TRUSTED_PROXY_HOPS].strip():
+            return hops[-TRUSTED_PROXY_HOPS].strip()
+    # request.client is None e.g. over a Unix socket or in the test client
+    return request.client.host if request.client else "unknown"
+
+
+AUTH_CACHE_TTL = 300  # seconds a validated token -> user id mapping is kept in Redis (L2)
+# Seconds it is kept in this worker's memory (L1). Short on purpose: L1 hits skip Redis,
+# so this bounds how long a token logged out on another worker keeps working here
+JWT_CACHE_TTL = 5
+JWT_CACHE_MAXSIZE = 10_000
+
+_jwt_cache = LRUCache(maxsize=JWT_CACHE_MAXSIZE, ttl=JWT_CACHE_TTL)  # token -> (user_id, exp)
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).digest()[:16].hex()
+
+
+def _auth_cache_key(token: str) -> str:
+    return "auth:" + _token_digest(token)
+
+
+def _revoked_key(token: str) -> str:
+    return "revoked:" + _token_digest(token)
+
+
+def _jwt_cache_get(token: str):
+    item = _jwt_cache.get(token)
+    if item is None:
+        return None
+    user_id, exp = item
+    if exp < time.time():  # never trust a cached token past its own expiry
+        _jwt_cache.delete(token)
+        return None
+    return user_id
 
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Plain int epoch seconds: what the exp claim is anyway, without building a datetime
+    to_encode["exp"] = int(time.time()) + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
 ) -> User:
@@ -62,6 +159,28 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Cache hit: token was validated recently -> skip JWT decode and the username query.
+    # L1 = dict lookup in this worker, L2 = Redis shared by all workers.
+    redis = request.app.state.redis
+    cache_key = _auth_cache_key(token)
+    user_id = _jwt_cache_get(token)
+    if user_id is None:
+        # One round trip for the L2 entry and the logout marker
+        cached, revoked = await redis.mget(cache_key, _revoked_key(token))  # "user_id:exp"
+        if revoked is not None:
+            raise credentials_exception
+        if cached is not None:
+            user_id, exp = cached.split(":")
+            user_id = int(user_id)
+            _jwt_cache.set(token, (user_id, float(exp)))
+    if user_id is not None:
+        user = await db.get(User, user_id)  # primary-key lookup
+        if user is not None:
+            return user
+        _jwt_cache.delete(token)  # user was deleted
+        await redis.delete(cache_key)
+        raise credentials_exception
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -76,6 +195,13 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
+    # Never cache a token past its own expiry
+    exp = payload["exp"]
+    _jwt_cache.set(token, (user.id, exp))
+    ttl = min(AUTH_CACHE_TTL, int(exp - time.time()))
+    if ttl > 0:
+        await redis.setex(cache_key, ttl, f"{user.id}:{exp}")
+    
     return user
 
 
@@ -96,42 +222,81 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    new_user = User(
-        username=user_data.username,
-        email=user_data.email,
-        hashed_password=hashed_password
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
+    # INSERT ... RETURNING hands back the row in the same round trip (no refresh)
+    result = await db.execute(
+        insert(User).values(
+            username=user_data.username,
+            email=user_data.email,
+            hashed_password=hashed_password
+        ).returning(User)
     )
-    
-    db.add(new_user)
+    new_user = result.scalar_one()
     await db.commit()
-    await db.refresh(new_user)
     
     return new_user
 
 
 @router.post("/token", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
+    # Fixed-window rate limit per IP, checked before any bcrypt work
+    rate_key = f"login:{client_ip(request)}"
+    # Registered once in the lifespan (app.state.login_rate_script)
+    attempts = await request.app.state.login_rate_script(keys=[rate_key], args=[LOGIN_RATE_WINDOW])
+    if attempts > LOGIN_RATE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(LOGIN_RATE_WINDOW)},
+        )
+    
     # Authenticate user
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Always pay for one bcrypt compare, whether or not the user exists
+    hashed_password = user.hashed_password if user else DUMMY_HASH
+    password_ok = await asyncio.to_thread(verify_password, form_data.password, hashed_password)
+    
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Upgrade the stored hash while we have the plaintext
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await asyncio.to_thread(get_password_hash, form_data.password)
+        await db.commit()
+    
     # Create access token
     access_token = create_access_token(data={"sub": user.username})
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/logout")
+async def logout(request: Request, token: str = Depends(oauth2_scheme)):
+    # JWTs are stateless: mark the token revoked until it would expire anyway, so a
+    # fresh decode can't revive it. Other workers' L1 entries expire within JWT_CACHE_TTL
+    redis = request.app.state.redis
+    _jwt_cache.delete(token)
+    try:
+        exp = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])["exp"]
+    except (JWTError, KeyError):
+        exp = time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    ttl = int(exp - time.time()) + 1
+    if ttl > 0:
+        await redis.setex(_revoked_key(token), ttl, 1)
+    await redis.delete(_auth_cache_key(token))
+    return {"message": "Logged out"}
+
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
\ No newline at end of file
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, func, insert, update, text
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+import io
 
 from app.core.database import get_db
-from app.models.models import User, Conversation, Message
+from app.models.models import User, Conversation, Message, utcnow_sql
 from app.api.auth import get_current_user
 
 router = APIRouter()
@@ -21,14 +23,14 @@ class MessageResponse(BaseModel):
     id: int
     role: str
     content: str
-    created_at: str
+    created_at: datetime
 
 
 class ConversationResponse(BaseModel):
     id: int
     title: Optional[str]
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
     messages: List[MessageResponse]
 
 
@@ -37,6 +39,42 @@ class ConversationListResponse(BaseModel):
     total: int
 
 
+# One page of conversations, each with its messages (oldest first), aggregated
+# into a JSON array inside Postgres. Same shape as List[ConversationResponse].
+CONVERSATION_PAGE_SQL = text("""
+    SELECT COALESCE(jsonb_agg(page.conv ORDER BY page.updated_at DESC), '[]'::jsonb)::text
+    FROM (
+        SELECT
+            c.updated_at,
+            jsonb_build_object(
+                'id', c.id,
+                'title', c.title,
+                'created_at', c.created_at,
+                'updated_at', c.updated_at,
+                'messages', COALESCE(msgs.items, '[]'::jsonb)
+            ) AS conv
+        FROM conversations c
+        LEFT JOIN LATERAL (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'id', m.id,
+                    'role', m.role,
+                    'content', m.content,
+                    'created_at', m.created_at
+                )
+                ORDER BY m.created_at
+            ) AS items
+            FROM messages m
+            WHERE m.conversation_id = c.id
+        ) msgs ON true
+        WHERE c.user_id = :user_id
+        ORDER BY c.updated_at DESC
+        OFFSET :skip
+        LIMIT :limit
+    ) page
+""")
+
+
 @router.post("/query")
 async def chat_query(
     request_data: ChatRequest,
@@ -53,72 +91,79 @@ async def chat_query(
     # Get or create conversation
     if request_data.conversation_id:
         result = await db.execute(
-            select(Conversation).where(
+            select(Conversation.id).where(
                 Conversation.id == request_data.conversation_id,
                 Conversation.user_id == current_user.id
             )
         )
-        conversation = result.scalar_one_or_none()
+        conversation_id = result.scalar_one_or_none()
         
-        if not conversation:
+        if conversation_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversation not found"
             )
     else:
-        # Create new conversation
-        conversation = Conversation(
-            user_id=current_user.id,
-            title=request_data.query[:50] + "..." if len(request_data.query) > 50 else request_data.query
+        # Create new conversation; RETURNING hands back its id without a refresh.
+        # Committed now: the history in Redis is keyed on the id during generation
+        result = await db.execute(
+            insert(Conversation)
+            .values(
+                user_id=current_user.id,
+                title=request_data.query[:50] + "..." if len(request_data.query) > 50 else request_data.query
+            )
+            .returning(Conversation.id)
         )
-        db.add(conversation)
+        conversation_id = result.scalar_one()
         await db.commit()
-        await db.refresh(conversation)
     
-    # Save user message
-    user_message = Message(
-        conversation_id=conversation.id,
-        role="user",
-        content=request_data.query
-    )
-    db.add(user_message)
-    await db.commit()
+    # Give the connection back to the pool for the whole LLM generation instead of
+    # holding it "idle in transaction"; the session checks out a new one afterwards
+    await db.close()
     
     # Get chat service
     vector_store = request.app.state.vector_store
-    chat_service = ChatService(vector_store)
+    chat_service = ChatService(vector_store, request.app.state.openai_client, request.app.state.redis)
     
-    # Collect streamed response
-    response_parts = []
+    # Collect streamed response into one growable buffer
+    response_buffer = io.StringIO()
     sources = []
     
     async for chunk in chat_service.stream_chat_response(
         query=request_data.query,
-        conversation_id=str(conversation.id),
+        conversation_id=str(conversation_id),
         user_id=str(current_user.id)
     ):
         if chunk["type"] == "content":
-            response_parts.append(chunk["content"])
+            response_buffer.write(chunk["content"])
         elif chunk["type"] == "complete":
             sources = chunk.get("sources", [])
     
-    full_response = "".join(response_parts)
+    full_response = response_buffer.getvalue()
     
-    # Save assistant message
-    assistant_message = Message(
-        conversation_id=conversation.id,
-        role="assistant",
-        content=full_response,
-        metadata={"sources": sources}
+    # Save the turn (both messages and updated_at) in one short transaction
+    db.add_all([
+        Message(
+            conversation_id=conversation_id,
+            role="user",
+            content=request_data.query
+        ),
+        Message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=full_response,
+            metadata={"sources": sources}
+        )
+    ])
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=utcnow_sql)  # evaluated by Postgres
     )
-    db.add(assistant_message)
-    
-    # Update conversation
-    conversation.updated_at = datetime.utcnow()
     await db.commit()
     
     return {
-        "conversation_id": conversation.id,
+        "conversation_id": conversation_id,
         "response": full_response,
         "sources": sources
     }
@@ -133,54 +178,23 @@ async def list_conversations(
 ):
     """List all conversations for the current user"""
     
-    # Get total count
+    # Get total count (COUNT(*) in Postgres, not every row loaded into Python)
     result = await db.execute(
-        select(Conversation).where(Conversation.user_id == current_user.id)
+        select(func.count()).select_from(Conversation).where(Conversation.user_id == current_user.id)
     )
-    all_convs = result.scalars().all()
-    total = len(all_convs)
+    total = result.scalar_one()
     
-    # Get paginated results
+    # Get paginated results with their messages as one JSON document built by
+    # Postgres: no per-row ORM objects, pydantic models or isoformat() calls
     result = await db.execute(
-        select(Conversation)
-        .where(Conversation.user_id == current_user.id)
-        .order_by(desc(Conversation.updated_at))
-        .offset(skip)
-        .limit(limit)
+        CONVERSATION_PAGE_SQL,
+        {"user_id": current_user.id, "skip": skip, "limit": limit}
     )
-    conversations = result.scalars().all()
-    
-    # Load messages for each conversation
-    conv_responses = []
-    for conv in conversations:
-        result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conv.id)
-            .order_by(Message.created_at)
-        )
-        messages = result.scalars().all()
-        
-        conv_responses.append(
-            ConversationResponse(
-                id=conv.id,
-                title=conv.title,
-                created_at=conv.created_at.isoformat(),
-                updated_at=conv.updated_at.isoformat(),
-                messages=[
-                    MessageResponse(
-                        id=msg.id,
-                        role=msg.role,
-                        content=msg.content,
-                        created_at=msg.created_at.isoformat()
-                    )
-                    for msg in messages
-                ]
-            )
-        )
+    conversations_json = result.scalar_one()
     
-    return ConversationListResponse(
-        conversations=conv_responses,
-        total=total
+    return Response(
+        content=f'{{"conversations":{conversations_json},"total":{total}}}',
+        media_type="application/json"
     )
 
 
@@ -193,7 +207,9 @@ async def get_conversation(
     """Get a specific conversation with all messages"""
     
     result = await db.execute(
-        select(Conversation).where(
+        select(Conversation)
+        .options(selectinload(Conversation.messages))  # ordered by created_at on the model
+        .where(
             Conversation.id == conversation_id,
             Conversation.user_id == current_user.id
         )
@@ -206,27 +222,20 @@ async def get_conversation(
             detail="Conversation not found"
         )
     
-    # Load messages
-    result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-    )
-    messages = result.scalars().all()
-    
-    return ConversationResponse(
+    # model_construct: rows straight from our DB are trusted, skip per-field validation
+    return ConversationResponse.model_construct(
         id=conversation.id,
         title=conversation.title,
-        created_at=conversation.created_at.isoformat(),
-        updated_at=conversation.updated_at.isoformat(),
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
         messages=[
-            MessageResponse(
+            MessageResponse.model_construct(
                 id=msg.id,
                 role=msg.role,
                 content=msg.content,
-                created_at=msg.created_at.isoformat()
+                created_at=msg.created_at
             )
-            for msg in messages
+            for msg in conversation.messages
         ]
     )
 
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, insert
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 from typing import List
+from datetime import datetime
+import aiofiles
+import asyncio
 import os
-import shutil
 from pathlib import Path
 from loguru import logger
 
@@ -12,10 +15,12 @@ from app.core.database import get_db
 from app.core.config import settings
 from app.models.models import User, Document, DocumentChunk
 from app.api.auth import get_current_user
-from app.services.document_processor import DocumentProcessor
 
 router = APIRouter()
 
+EMBED_BATCH_SIZE = 64  # chunks per vector_store.add_documents call
+UPLOAD_READ_SIZE = 1 << 20  # 1 MiB
+
 
 class DocumentResponse(BaseModel):
     id: int
@@ -23,7 +28,7 @@ class DocumentResponse(BaseModel):
     file_type: str
     file_size: int
     status: str
-    created_at: str
+    created_at: datetime
 
 
 class DocumentListResponse(BaseModel):
@@ -48,26 +53,29 @@ async def upload_document(
             detail=f"File type {file_ext} not allowed. Allowed types: {settings.ALLOWED_EXTENSIONS}"
         )
     
-    # Validate file size
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
+    # Create upload directory if it doesn't exist
+    upload_dir = Path(settings.UPLOAD_DIR) / str(current_user.id)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Save file in 1 MiB pieces with async writes: memory per upload stays at one
+    # buffer, and the size limit is enforced while streaming instead of up front
+    file_path = upload_dir / file.filename
+    file_size = 0
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_READ_SIZE):
+            file_size += len(chunk)
+            if file_size > settings.MAX_UPLOAD_SIZE:
+                break
+            await buffer.write(chunk)
     
+    # Validate file size
     if file_size > settings.MAX_UPLOAD_SIZE:
+        os.remove(file_path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File size exceeds maximum allowed size of {settings.MAX_UPLOAD_SIZE} bytes"
         )
     
-    # Create upload directory if it doesn't exist
-    upload_dir = Path(settings.UPLOAD_DIR) / str(current_user.id)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Save file
-    file_path = upload_dir / file.filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
     logger.info(f"File saved: {file_path}")
     
     # Create document record
@@ -80,17 +88,18 @@ async def upload_document(
         status="pending"
     )
     
+    # expire_on_commit=False keeps id/created_at loaded after the flush,
+    # so no refresh SELECT is needed here or after the final commit
     db.add(document)
     await db.commit()
-    await db.refresh(document)
     
     # Process document asynchronously (in production, use a task queue)
     try:
         document.status = "processing"
         await db.commit()
         
-        # Process document
-        processor = DocumentProcessor()
+        # Process document (processor is created once at startup)
+        processor = request.app.state.document_processor
         chunks = await processor.process_document(str(file_path), file_ext)
         
         # Get vector store from request state
@@ -107,28 +116,39 @@ async def upload_document(
             for chunk in chunks
         ]
         
-        vector_ids = await vector_store.add_documents(
-            texts=chunk_texts,
-            metadatas=chunk_metadatas
-        )
+        # Embed in batches concurrently: the embedding round trips overlap, so a
+        # large document takes about as long as its slowest batch, not the sum.
+        # IDs are fixed up front so concurrent batches can't collide.
+        vector_ids = [f"doc_{document.id}_{i}" for i in range(len(chunks))]
+        await asyncio.gather(*[
+            vector_store.add_documents(
+                texts=chunk_texts[start:start + EMBED_BATCH_SIZE],
+                metadatas=chunk_metadatas[start:start + EMBED_BATCH_SIZE],
+                ids=vector_ids[start:start + EMBED_BATCH_SIZE]
+            )
+            for start in range(0, len(chunks), EMBED_BATCH_SIZE)
+        ])
         
-        # Save chunks to database
-        for i, (chunk, vector_id) in enumerate(zip(chunks, vector_ids)):
-            db_chunk = DocumentChunk(
-                document_id=document.id,
-                chunk_index=i,
-                content=chunk['content'],
-                metadata=chunk['metadata'],
-                vector_id=vector_id
+        # Save chunks to database: one bulk INSERT instead of one per chunk
+        if chunks:
+            await db.execute(
+                insert(DocumentChunk),
+                [
+                    {
+                        "document_id": document.id,
+                        "chunk_index": i,
+                        "content": chunk['content'],
+                        "metadata": chunk['metadata'],
+                        "vector_id": vector_id
+                    }
+                    for i, (chunk, vector_id) in enumerate(zip(chunks, vector_ids))
+                ]
             )
-            db.add(db_chunk)
         
         document.status = "completed"
-        from datetime import datetime
         document.processed_at = datetime.utcnow()
         
         await db.commit()
-        await db.refresh(document)
         
         logger.info(f"Document processed successfully: {document.filename}")
         
@@ -142,13 +162,13 @@ async def upload_document(
             detail=f"Error processing document: {str(e)}"
         )
     
-    return DocumentResponse(
+    return DocumentResponse.model_construct(
         id=document.id,
         filename=document.filename,
         file_type=document.file_type,
         file_size=document.file_size,
         status=document.status,
-        created_at=document.created_at.isoformat()
+        created_at=document.created_at
     )
 
 
@@ -161,12 +181,11 @@ async def list_documents(
 ):
     """List all documents for the current user"""
     
-    # Get total count
+    # Get total count (COUNT(*) in Postgres, not every row loaded into Python)
     result = await db.execute(
-        select(Document).where(Document.user_id == current_user.id)
+        select(func.count()).select_from(Document).where(Document.user_id == current_user.id)
     )
-    all_docs = result.scalars().all()
-    total = len(all_docs)
+    total = result.scalar_one()
     
     # Get paginated results
     result = await db.execute(
@@ -177,15 +196,16 @@ async def list_documents(
     )
     documents = result.scalars().all()
     
-    return DocumentListResponse(
+    # model_construct: rows straight from our DB are trusted, skip per-field validation
+    return DocumentListResponse.model_construct(
         documents=[
-            DocumentResponse(
+            DocumentResponse.model_construct(
                 id=doc.id,
                 filename=doc.filename,
                 file_type=doc.file_type,
                 file_size=doc.file_size,
                 status=doc.status,
-                created_at=doc.created_at.isoformat()
+                created_at=doc.created_at
             )
             for doc in documents
         ],
@@ -215,13 +235,13 @@ async def get_document(
             detail="Document not found"
         )
     
-    return DocumentResponse(
+    return DocumentResponse.model_construct(
         id=document.id,
         filename=document.filename,
         file_type=document.file_type,
         file_size=document.file_size,
         status=document.status,
-        created_at=document.created_at.isoformat()
+        created_at=document.created_at
     )
 
 
@@ -235,7 +255,9 @@ async def delete_document(
     """Delete a document"""
     
     result = await db.execute(
-        select(Document).where(
+        select(Document)
+        .options(selectinload(Document.chunks))  # vector ids come with the document
+        .where(
             Document.id == document_id,
             Document.user_id == current_user.id
         )
@@ -248,23 +270,21 @@ async def delete_document(
             detail="Document not found"
         )
     
-    # Delete from vector store
-    result = await db.execute(
-        select(DocumentChunk).where(DocumentChunk.document_id == document_id)
-    )
-    chunks = result.scalars().all()
+    vector_ids = [chunk.vector_id for chunk in document.chunks if chunk.vector_id]
     
-    vector_ids = [chunk.vector_id for chunk in chunks if chunk.vector_id]
+    async def delete_vectors():
+        if vector_ids:
+            await request.app.state.vector_store.delete_documents(vector_ids)
     
-    if vector_ids:
-        vector_store = request.app.state.vector_store
-        await vector_store.delete_documents(vector_ids)
+    async def delete_file():
+        try:
+            await asyncio.to_thread(os.remove, document.file_path)
+        except Exception as e:
+            logger.warning(f"Could not delete file: {str(e)}")
     
-    # Delete file
-    try:
-        os.remove(document.file_path)
-    except Exception as e:
-        logger.warning(f"Could not delete file: {str(e)}")
+    # Delete from vector store and disk at the same time: the file unlink
+    # hides behind the vector store round trip
+    await asyncio.gather(delete_vectors(), delete_file())
     
     # Delete from database (cascades to chunks)
     await db.delete(document)
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import time
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache with optional TTL.
+    Single event loop per worker, so no lock is needed around get/set.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, valid_until), LRU order
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, valid_until = item
+        if valid_until is not None and valid_until < time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)  # mark as recently used
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        valid_until = time.time() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, valid_until)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)  # evict least recently used
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,14 +1,35 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy import text
+import asyncio
 from app.core.config import settings
 
 # Convert postgresql:// to postgresql+asyncpg://
 database_url = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
+# Every worker process has its own pool: split one total connection budget between
+# them so WORKERS x (pool + overflow) stays under Postgres' max_connections (100 default)
+# Defaults match the README, for settings files written before these existed
+DEBUG = getattr(settings, "DEBUG", False)
+WORKERS = getattr(settings, "WORKERS", 4)
+DB_MAX_CONNECTIONS = getattr(settings, "DB_MAX_CONNECTIONS", 80)
+WORKER_COUNT = 1 if DEBUG else WORKERS  # DEBUG runs a single process
+DB_CONNECTIONS_PER_WORKER = max(DB_MAX_CONNECTIONS // WORKER_COUNT, 2)
+POOL_SIZE = DB_CONNECTIONS_PER_WORKER * 2 // 3             # kept open (and pre-warmed)
+MAX_OVERFLOW = DB_CONNECTIONS_PER_WORKER - POOL_SIZE       # opened only under load spikes
+
 engine = create_async_engine(
     database_url,
-    echo=settings.DEBUG,
-    future=True
+    echo=DEBUG,
+    future=True,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=True,  # drop dead connections instead of failing a request
+    connect_args={
+        # asyncpg prepares each statement once per connection and reuses the plan
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 512,  # SQLAlchemy-side cache of those statements
+    }
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -32,4 +53,15 @@ async def get_db():
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def warm_pool():
+    """Open POOL_SIZE connections before serving traffic, so the first requests
+    don't pay TCP + auth + connection setup"""
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    
+    # Concurrently: a sequential loop would just reuse the same connection
+    await asyncio.gather(*(ping() for _ in range(POOL_SIZE)))
\ No newline at end of file
@@ -1,13 +1,23 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from contextlib import aclosing, asynccontextmanager, suppress
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
+import asyncio
+import httpx
+import orjson
+import os
+import redis.asyncio as aioredis
+from openai import AsyncOpenAI
 import sys
 
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, warm_pool, DEBUG, WORKERS
 from app.api import documents, chat, auth
 from app.services.vector_store import VectorStoreManager
+from app.services.document_processor import DocumentProcessor
 
 # Configure logging
 logger.remove()
@@ -24,24 +34,54 @@ async def lifespan(app: FastAPI):
     """Lifecycle manager for startup and shutdown events"""
     logger.info("Starting Advanced RAG Agent Chat System...")
     
+    # One shared pool for asyncio.to_thread work (bcrypt): sized to the cores,
+    # since the hashing releases the GIL and runs truly in parallel
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    asyncio.get_running_loop().set_default_executor(executor)
+    
     # Initialize database
     await init_db()
+    await warm_pool()
     logger.info("Database initialized")
     
+    # One OpenAI client for every service: a single keep-alive connection pool,
+    # so TLS handshakes are paid once, not per service instance / per request
+    app.state.openai_client = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+    )
+    
     # Initialize vector store
-    vector_store_manager = VectorStoreManager()
+    vector_store_manager = await VectorStoreManager.create(app.state.openai_client)
     app.state.vector_store = vector_store_manager
     logger.info("Vector store initialized")
     
+    # Redis: auth token cache, conversation history, vision-parse cache
+    app.state.redis = aioredis.from_url(
+        getattr(settings, "REDIS_URL", "redis://localhost:6379/0"), decode_responses=True
+    )
+    app.state.login_rate_script = app.state.redis.register_script(auth.LOGIN_RATE_LUA)
+    logger.info("Redis client initialized")
+    
+    # One document processor shared by all uploads
+    app.state.document_processor = DocumentProcessor(app.state.openai_client, app.state.redis)
+    logger.info("Document processor initialized")
+    
     yield
     
     logger.info("Shutting down...")
+    await app.state.redis.aclose()
+    await app.state.openai_client.close()
+    executor.shutdown(wait=False)
 
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # C encoder; datetimes serialized natively
 )
 
 # CORS middleware
@@ -53,6 +93,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses over 1 KB (conversation histories are mostly text)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
@@ -73,44 +116,98 @@ async def health_check():
     return {"status": "healthy"}
 
 
+WS_MAX_MESSAGE_SIZE = 16_384  # bytes; a chat query never needs more
+WS_IDLE_TIMEOUT = 300         # seconds to wait for the next client message
+WS_SEND_QUEUE_SIZE = 32       # chunks buffered ahead of a slow client
+
+
 @app.websocket("/ws/chat/{conversation_id}")
 async def websocket_chat_endpoint(websocket: WebSocket, conversation_id: str):
     """WebSocket endpoint for real-time chat streaming"""
     from app.services.chat_service import ChatService
     
     await websocket.accept()
-    chat_service = ChatService(app.state.vector_store)
+    chat_service = ChatService(app.state.vector_store, app.state.openai_client, app.state.redis)
+    
+    async def send(payload: dict):
+        await websocket.send_text(orjson.dumps(payload).decode())
     
     try:
         while True:
-            # Receive message from client
-            data = await websocket.receive_json()
+            # Receive message from client: raw text so size is checked before parsing
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000)
+                return
+            if len(raw) > WS_MAX_MESSAGE_SIZE:
+                await websocket.close(code=1009)  # message too big
+                return
+            data = orjson.loads(raw)
             query = data.get("query", "")
             user_id = data.get("user_id", "anonymous")
             
             logger.info(f"Received query from user {user_id}: {query[:50]}...")
             
-            # Stream response back to client
-            async for chunk in chat_service.stream_chat_response(
-                query=query,
-                conversation_id=conversation_id,
-                user_id=user_id
-            ):
-                await websocket.send_json(chunk)
+            # Stream response back to client through a bounded queue: when the client
+            # reads slowly, put() blocks and the generator pauses instead of buffering
+            queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+            
+            async def produce():
+                cancelled = False
+                try:
+                    # aclosing: the LLM stream is closed as soon as we stop, not at GC
+                    async with aclosing(chat_service.stream_chat_response(
+                        query=query,
+                        conversation_id=conversation_id,
+                        user_id=user_id
+                    )) as stream:
+                        async for chunk in stream:
+                            await queue.put(chunk)
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+                finally:
+                    # No end marker once cancelled: the consumer is gone, and a put
+                    # into a full queue would then block this task forever
+                    if not cancelled:
+                        await queue.put(None)  # end of response
+            
+            producer = asyncio.create_task(produce())
+            try:
+                while (chunk := await queue.get()) is not None:
+                    await send(chunk)
+                await producer  # surface generator errors
+            finally:
+                producer.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await producer  # wait until the stream is really closed
                 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for conversation {conversation_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
-        await websocket.send_json({"error": str(e)})
+        await send({"error": str(e)})
         await websocket.close()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8080,
-        reload=True
-    )
\ No newline at end of file
+    if DEBUG:
+        # Dev only: the reload watcher forks and slows startup
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8080, reload=True)
+    else:
+        # uvloop (libuv) event loop + httptools C parser, one process per worker
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8080,
+            loop="uvloop",
+            http="httptools",
+            ws="websockets",
+            workers=WORKERS,
+            ws_max_size=1 << 20,   # hard frame cap at the protocol layer
+            ws_ping_interval=20,   # drop dead peers instead of holding their buffers
+            ws_ping_timeout=10,
+            log_config=None  # loguru handles logging
+        )
\ No newline at end of file
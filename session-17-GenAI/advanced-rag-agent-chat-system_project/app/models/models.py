@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
 
+# Database-side equivalent of datetime.utcnow() (naive UTC, like the Python defaults)
+utcnow_sql = func.timezone("utc", func.now())
+
 
 class User(Base):
     __tablename__ = "users"
@@ -57,10 +60,20 @@ class Conversation(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=utcnow_sql)
+    
+    # WHERE user_id = ? ORDER BY updated_at DESC -> ordered index scan, no sort
+    __table_args__ = (
+        Index("ix_conv_user_updated", user_id, updated_at.desc()),
+    )
     
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="Message.created_at"
+    )
 
 
 class Message(Base):
@@ -73,4 +86,9 @@ class Message(Base):
     metadata = Column(JSON, nullable=True)  # For storing retrieved chunks, reasoning steps, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # WHERE conversation_id = ? ORDER BY created_at -> ordered index scan, no sort
+    __table_args__ = (
+        Index("ix_msg_conv_created", conversation_id, created_at),
+    )
+    
     conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
@@ -1,10 +1,62 @@
 from typing import AsyncIterator, Dict, Any, List
 from loguru import logger
 from openai import AsyncOpenAI
+import asyncio
 import json
+import orjson
+import time
+from redis.exceptions import WatchError
 
 from app.core.config import settings
-from app.services.rag_pipeline import AdvancedRAGPipeline
+from app.core.cache import LRUCache
+from app.services.rag_pipeline import AdvancedRAGPipeline, _normalize_query, _content_digest
+
+# Parsed workflow plans per normalized query; ChatService is per-connection, so module level
+_plan_cache = LRUCache(maxsize=1024, ttl=3600)
+
+# Structured output for the planner: always a complete, parseable plan
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "workflow_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "needs_retrieval": {"type": "boolean"},
+                "use_hyde": {"type": "boolean"},
+                "use_reranking": {"type": "boolean"},
+                "use_reasoning": {"type": "boolean"},
+                "search_strategy": {"type": "string", "enum": ["semantic", "keyword", "hybrid"]},
+                "explanation": {"type": "string"}
+            },
+            "required": [
+                "needs_retrieval", "use_hyde", "use_reranking",
+                "use_reasoning", "search_strategy", "explanation"
+            ],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Conversation history: Redis is the source of truth (read on every turn, so all workers
+# see the same conversation; new turns are appended under WATCH, so concurrent turns
+# are never overwritten). The in-memory LRU is only the store when Redis isn't configured
+#
+# Prompt-cache friendly: history is append-only between compactions, so the
+# [system, summary, turns...] prefix is identical from one turn to the next. Old turns
+# are folded into the summary in blocks (every ~10 messages), not shifted out per turn.
+HISTORY_MAX_MESSAGES = 20       # compaction trigger
+HISTORY_KEEP_MESSAGES = 10      # most recent messages kept verbatim after compaction
+HISTORY_SUMMARY_MAX_CHARS = 4000
+HISTORY_SUMMARY_MARKER = "<<HISTORY_SUMMARY>>"
+HISTORY_CACHE_SIZE = 10_000     # conversations kept in memory without Redis
+HISTORY_TTL = 7 * 24 * 3600     # seconds a conversation's history lives in Redis
+_history_cache = LRUCache(maxsize=HISTORY_CACHE_SIZE)
+
+# Token coalescing: one content event per ~32 chars or 50 ms instead of one per token
+STREAM_FLUSH_CHARS = 32
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
 
 
 class ChatService:
@@ -12,10 +64,10 @@ class ChatService:
     Chat service with agentic orchestration using OpenAI o3 model
     """
     
-    def __init__(self, vector_store):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.rag_pipeline = AdvancedRAGPipeline(vector_store)
-        self.conversation_history = {}
+    def __init__(self, vector_store, client: AsyncOpenAI, redis=None):
+        self.client = client  # shared app-wide client
+        self.rag_pipeline = AdvancedRAGPipeline(vector_store, client)
+        self.redis = redis  # history store shared across workers (optional)
     
     async def stream_chat_response(
         self,
@@ -28,9 +80,8 @@ class ChatService:
         """
         logger.info(f"Processing chat query for conversation {conversation_id}")
         
-        # Initialize conversation history if needed
-        if conversation_id not in self.conversation_history:
-            self.conversation_history[conversation_id] = []
+        conversation_history = await self._load_history(conversation_id)
+        loaded_len = len(conversation_history)  # messages past this are this turn's
         
         try:
             # Step 1: Agent decides the workflow
@@ -45,15 +96,22 @@ class ChatService:
             
             # Step 2: Execute retrieval if needed
             retrieved_docs = []
+            rerank_task = None
             if workflow_plan.get("needs_retrieval", True):
                 yield {"type": "status", "message": "Retrieving relevant documents..."}
                 
-                retrieved_docs = await self.rag_pipeline.retrieve(
+                retrieved_docs = await self.rag_pipeline.retrieve_candidates(
                     query=query,
-                    use_hyde=workflow_plan.get("use_hyde", True),
-                    use_reranking=workflow_plan.get("use_reranking", True)
+                    use_hyde=workflow_plan.get("use_hyde", True)
                 )
                 
+                if workflow_plan.get("use_reranking", True):
+                    # Rerank in the background; generation starts on the RRF top-k meanwhile
+                    rerank_task = asyncio.create_task(self.rag_pipeline.llm_rerank(
+                        query, retrieved_docs, top_k=settings.RERANK_TOP_K
+                    ))
+                    retrieved_docs = retrieved_docs[:settings.RERANK_TOP_K]
+                
                 yield {
                     "type": "retrieval",
                     "num_docs": len(retrieved_docs)
@@ -62,19 +120,31 @@ class ChatService:
             # Step 3: Generate response with reasoning
             yield {"type": "status", "message": "Generating response..."}
             
-            async for chunk in self._generate_response_stream(
-                query=query,
-                retrieved_docs=retrieved_docs,
-                conversation_history=self.conversation_history[conversation_id],
-                use_reasoning=workflow_plan.get("use_reasoning", False)
-            ):
+            if rerank_task is None:
+                response_stream = self._generate_response_stream(
+                    query=query,
+                    retrieved_docs=retrieved_docs,
+                    conversation_history=conversation_history,
+                    use_reasoning=workflow_plan.get("use_reasoning", False)
+                )
+            else:
+                response_stream = self._speculative_response_stream(
+                    query=query,
+                    provisional_docs=retrieved_docs,
+                    rerank_task=rerank_task,
+                    conversation_history=conversation_history,
+                    use_reasoning=workflow_plan.get("use_reasoning", False)
+                )
+            
+            async for chunk in response_stream:
                 yield chunk
             
             # Update conversation history
-            self.conversation_history[conversation_id].append({
+            conversation_history.append({
                 "role": "user",
                 "content": query
             })
+            await self._save_history(conversation_id, conversation_history[loaded_len:])
             
         except Exception as e:
             logger.error(f"Error in chat service: {str(e)}")
@@ -83,11 +153,75 @@ class ChatService:
                 "message": f"An error occurred: {str(e)}"
             }
     
+    async def _load_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """This request's own copy of the history: Redis, else memory, else a new conversation"""
+        key = f"history:{conversation_id}"  # str key: REST passes int ids, WebSocket str
+        if self.redis is not None:
+            raw = await self.redis.get(key)
+            return json.loads(raw) if raw else []
+        return list(_history_cache.get(key, ()))
+    
+    async def _save_history(self, conversation_id: str, new_messages: List[Dict[str, str]]):
+        """
+        Append this turn's messages to the stored history (not overwrite it with this
+        request's copy, which may be stale), compacting old turns into the summary slot
+        """
+        key = f"history:{conversation_id}"
+        if self.redis is None:
+            history = list(_history_cache.get(key, ()))
+            history.extend(new_messages)
+            self._compact_history(history)
+            _history_cache.set(key, history)  # fresh list: requests never share it
+            return
+        
+        # Optimistic transaction: retried if another worker wrote the key meanwhile
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    history = json.loads(raw) if raw else []
+                    history.extend(new_messages)
+                    self._compact_history(history)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(history), ex=HISTORY_TTL)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+    
+    @staticmethod
+    def _compact_history(history: List[Dict[str, str]]):
+        """
+        In place: past HISTORY_MAX_MESSAGES turns, fold all but the last
+        HISTORY_KEEP_MESSAGES into history[0], a system message holding the summary
+        """
+        has_summary = bool(history) and history[0]["content"].startswith(HISTORY_SUMMARY_MARKER)
+        turns = history[1:] if has_summary else history
+        if len(turns) <= HISTORY_MAX_MESSAGES:
+            return
+        
+        lines = [history[0]["content"][len(HISTORY_SUMMARY_MARKER) + 1:]] if has_summary else []
+        lines.extend(
+            f"{msg['role']}: {msg['content'][:200]}"
+            for msg in turns[:-HISTORY_KEEP_MESSAGES]
+        )
+        summary = "\n".join(lines)[-HISTORY_SUMMARY_MAX_CHARS:]  # oldest text drops first
+        
+        history[:] = [
+            {"role": "system", "content": f"{HISTORY_SUMMARY_MARKER}\n{summary}"}
+        ] + turns[-HISTORY_KEEP_MESSAGES:]
+    
     async def _plan_workflow(self, query: str) -> Dict[str, Any]:
         """
         Use agent to plan the RAG workflow dynamically
         This is the agentic orchestration layer
         """
+        cache_key = (_normalize_query(query), settings.CHAT_MODEL)
+        workflow_plan = _plan_cache.get(cache_key)
+        if workflow_plan is not None:
+            return dict(workflow_plan)
+        
         planning_prompt = f"""Analyze this user query and determine the optimal RAG workflow:
 
 Query: "{query}"
@@ -119,16 +253,18 @@ Respond in JSON format only."""
                     }
                 ],
                 temperature=0.3,
-                max_tokens=300
+                max_tokens=300,
+                response_format=PLAN_RESPONSE_FORMAT  # no code fences / preambles to strip
             )
             
             content = response.choices[0].message.content
             
             # Parse JSON response
-            workflow_plan = json.loads(content.strip())
+            workflow_plan = orjson.loads(content)
             
             logger.info(f"Workflow plan: {workflow_plan.get('explanation', 'N/A')}")
-            return workflow_plan
+            _plan_cache.set(cache_key, workflow_plan)  # failures fall through uncached
+            return dict(workflow_plan)
             
         except Exception as e:
             logger.error(f"Workflow planning failed: {str(e)}")
@@ -177,17 +313,35 @@ Respond in JSON format only."""
                 max_tokens=2000
             )
             
-            full_response = ""
+            parts = []        # whole response, joined once at the end
+            pending = []      # tokens not yet sent
+            pending_size = 0
+            last_flush = time.monotonic()
             
             async for chunk in stream:
                 if chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
-                    full_response += content
+                    parts.append(content)
+                    pending.append(content)
+                    pending_size += len(content)
                     
-                    yield {
-                        "type": "content",
-                        "content": content
-                    }
+                    now = time.monotonic()
+                    if pending_size >= STREAM_FLUSH_CHARS or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        yield {
+                            "type": "content",
+                            "content": "".join(pending)
+                        }
+                        pending.clear()
+                        pending_size = 0
+                        last_flush = now
+            
+            if pending:
+                yield {
+                    "type": "content",
+                    "content": "".join(pending)
+                }
+            
+            full_response = "".join(parts)
             
             # Save assistant response to history
             conversation_history.append({
@@ -208,6 +362,64 @@ Respond in JSON format only."""
                 "message": f"Failed to generate response: {str(e)}"
             }
     
+    async def _speculative_response_stream(
+        self,
+        query: str,
+        provisional_docs: List[Dict[str, Any]],
+        rerank_task: asyncio.Task,
+        conversation_history: List[Dict[str, str]],
+        use_reasoning: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate on the provisional (RRF) documents while the rerank runs. Output is held
+        back until the rerank finishes: same documents -> release it (TTFT saves the
+        rerank latency); different documents -> drop it and regenerate on the reranked set
+        """
+        queue = asyncio.Queue()
+        speculative_history = list(conversation_history)  # committed only if accepted
+        
+        async def speculate():
+            try:
+                async for chunk in self._generate_response_stream(
+                    query=query,
+                    retrieved_docs=provisional_docs,
+                    conversation_history=speculative_history,
+                    use_reasoning=use_reasoning
+                ):
+                    await queue.put(chunk)
+            finally:
+                await queue.put(None)  # end of stream
+        
+        speculation = asyncio.create_task(speculate())
+        try:
+            reranked_docs = await rerank_task
+            
+            if self._doc_ids(reranked_docs) == self._doc_ids(provisional_docs):
+                while (chunk := await queue.get()) is not None:
+                    if chunk["type"] == "complete":
+                        # Same documents, now with relevance scores
+                        chunk["sources"] = self._format_sources(reranked_docs)
+                    yield chunk
+                conversation_history[:] = speculative_history
+                return
+            
+            logger.info("Rerank changed the top documents, regenerating")
+            speculation.cancel()
+            async for chunk in self._generate_response_stream(
+                query=query,
+                retrieved_docs=reranked_docs,
+                conversation_history=conversation_history,
+                use_reasoning=use_reasoning
+            ):
+                yield chunk
+        finally:
+            speculation.cancel()
+            rerank_task.cancel()
+    
+    @staticmethod
+    def _doc_ids(docs: List[Dict[str, Any]]) -> set:
+        return {doc.get('id') or _content_digest(doc.get('content', '')) for doc in docs}
+    
     def _build_context(self, retrieved_docs: List[Dict[str, Any]]) -> str:
         """Build context string from retrieved documents"""
         if not retrieved_docs:
@@ -251,8 +463,9 @@ Always be helpful, accurate, and transparent about your sources and limitations.
             }
         ]
         
-        # Add conversation history (last 5 exchanges)
-        messages.extend(conversation_history[-10:])
+        # Add conversation history (summary slot + recent turns, bounded by _compact_history).
+        # Sent whole, not as a sliding [-10:] window, so this prefix stays stable
+        messages.extend(conversation_history)
         
         # Add current query with context
         user_message = f"""Context from knowledge base:
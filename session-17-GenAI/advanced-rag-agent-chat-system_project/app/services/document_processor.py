@@ -1,4 +1,7 @@
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import json
 import os
 from pathlib import Path
 from loguru import logger
@@ -7,18 +10,56 @@ import base64
 from io import BytesIO
 from PIL import Image
 import PyPDF2
+import tiktoken
 from docx import Document as DocxDocument
 
 from app.core.config import settings
 
+VISION_CACHE_TTL = 30 * 24 * 3600  # seconds parsed page text is kept in Redis
+HASH_READ_SIZE = 1 << 20
+VISION_CONCURRENCY = 8  # pages parsed at once; bounded by OpenAI rate limits
+VISION_MAX_SIDE = 2048  # px; the vision model's tiling gains nothing past this
+VISION_JPEG_QUALITY = 85
+PDF_RENDER_DPI = 150    # enough for text; 2048 px covers an A4 page at this DPI
+# Chunking in tokens of EMBEDDING_MODEL (README defaults if the settings lack them)
+CHUNK_SIZE_TOKENS = getattr(settings, "CHUNK_SIZE_TOKENS", 256)
+CHUNK_OVERLAP_TOKENS = getattr(settings, "CHUNK_OVERLAP_TOKENS", 50)
+
+# Chunk sizes are measured in the embedding model's tokens (encoder built once)
+try:
+    _ENC = tiktoken.encoding_for_model(settings.EMBEDDING_MODEL)
+except KeyError:
+    _ENC = tiktoken.get_encoding("cl100k_base")  # text-embedding-3-* family
+
 
 class DocumentProcessor:
     """
     Processes documents with Vision-based parsing for complex structures
     """
     
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, client: AsyncOpenAI, redis=None):
+        self.client = client  # shared app-wide client
+        self.redis = redis  # vision-parse cache, shared by all workers (optional)
+    
+    @staticmethod
+    def _file_sha256(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while block := f.read(HASH_READ_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _encode_image(image: Image.Image) -> str:
+        """Page image -> base64 JPEG, longest side capped at VISION_MAX_SIDE"""
+        # JPEG instead of lossless PNG: several times smaller request bodies for scanned/
+        # rendered pages, with no loss the vision model can see
+        image.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE))  # in place, keeps aspect ratio
+        if image.mode != "RGB":
+            image = image.convert("RGB")  # JPEG has no alpha/palette
+        buffered = BytesIO()
+        image.save(buffered, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        return base64.b64encode(buffered.getvalue()).decode()
     
     async def process_document(
         self,
@@ -42,26 +83,58 @@ class DocumentProcessor:
         chunks = []
         
         try:
-            # Convert PDF pages to images for vision parsing
-            from pdf2image import pdftoimage
-            
-            images = pdftoimage.convert_from_path(file_path)
+            # Same file bytes + same vision model = same parsed pages: re-uploads of a known
+            # PDF (by any user) skip rasterizing and every vision call
+            file_hash = await asyncio.to_thread(self._file_sha256, file_path)
+            cache_key = f"vision:{settings.VISION_MODEL}:{file_hash}"
+            page_contents = None
+            if self.redis is not None:
+                cached = await self.redis.get(cache_key)
+                if cached:
+                    page_contents = json.loads(cached)
+                    logger.info(f"Vision cache hit for {file_path} ({len(page_contents)} pages)")
             
-            for page_num, image in enumerate(images, start=1):
-                logger.info(f"Processing PDF page {page_num}")
-                
-                # Convert image to base64
-                buffered = BytesIO()
-                image.save(buffered, format="PNG")
-                img_base64 = base64.b64encode(buffered.getvalue()).decode()
+            if page_contents is None:
+                # Convert PDF pages to images for vision parsing
+                from pdf2image import convert_from_path
                 
-                # Use GPT-4 Vision to parse the page
-                page_content = await self._vision_parse_page(
-                    img_base64,
-                    page_num
+                # Poppler renders pages on several threads; the call blocks, so off the loop
+                images = await asyncio.to_thread(
+                    convert_from_path,
+                    file_path,
+                    dpi=PDF_RENDER_DPI,
+                    thread_count=min(4, os.cpu_count() or 1),
+                    fmt="jpeg"
                 )
                 
-                # Chunk the parsed content
+                # Parse pages concurrently, at most VISION_CONCURRENCY in flight:
+                # wall time ~ ceil(pages / 8) vision calls instead of one per page
+                semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+                
+                async def parse_page(page_num: int, image: Image.Image) -> Optional[str]:
+                    async with semaphore:
+                        logger.info(f"Processing PDF page {page_num}")
+                        
+                        # Convert image to base64 JPEG (off the event loop)
+                        img_base64 = await asyncio.to_thread(self._encode_image, image)
+                        
+                        # Use GPT-4 Vision to parse the page
+                        return await self._vision_parse_page(img_base64, page_num)
+                
+                page_contents = await asyncio.gather(*[
+                    parse_page(page_num, image)
+                    for page_num, image in enumerate(images, start=1)
+                ])
+                
+                # Only fully parsed documents are cached, so failed pages get retried
+                if self.redis is not None and all(c is not None for c in page_contents):
+                    await self.redis.set(cache_key, json.dumps(page_contents), ex=VISION_CACHE_TTL)
+            
+            for page_num, page_content in enumerate(page_contents, start=1):
+                if page_content is None:
+                    page_content = f"[Page {page_num}] - Error parsing page"
+                
+                # Chunk the parsed content (cheap; done per upload so 'source' is this file)
                 page_chunks = self._chunk_text(
                     page_content,
                     metadata={
@@ -90,8 +163,8 @@ class DocumentProcessor:
         self,
         img_base64: str,
         page_num: int
-    ) -> str:
-        """Use GPT-4 Vision to parse page content including tables and structure"""
+    ) -> Optional[str]:
+        """Use GPT-4 Vision to parse page content including tables and structure (None on failure)"""
         try:
             response = await self.client.chat.completions.create(
                 model=settings.VISION_MODEL,
@@ -115,7 +188,7 @@ Be thorough and accurate."""
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{img_base64}"
+                                    "url": f"data:image/jpeg;base64,{img_base64}"
                                 }
                             }
                         ]
@@ -129,19 +202,30 @@ Be thorough and accurate."""
             
         except Exception as e:
             logger.error(f"Vision parsing failed for page {page_num}: {str(e)}")
-            return f"[Page {page_num}] - Error parsing page"
+            return None
     
     async def _pdf_text_fallback(self, file_path: str) -> List[Dict[str, Any]]:
         """Fallback text extraction from PDF"""
         chunks = []
         
+        async for page_chunks in self._iter_pdf_text_chunks(file_path):
+            chunks.extend(page_chunks)
+        
+        return chunks
+    
+    async def _iter_pdf_text_chunks(self, file_path: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Chunks of one page at a time: PyPDF2 parses pages lazily from the open file,
+        so only the current page's text is alive; extraction runs off the event loop
+        """
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                text = page.extract_text()
+            for page_num in range(1, len(pdf_reader.pages) + 1):
+                page = pdf_reader.pages[page_num - 1]
+                text = await asyncio.to_thread(page.extract_text)
                 
-                page_chunks = self._chunk_text(
+                yield self._chunk_text(
                     text,
                     metadata={
                         'page': page_num,
@@ -149,10 +233,6 @@ Be thorough and accurate."""
                         'type': 'pdf'
                     }
                 )
-                
-                chunks.extend(page_chunks)
-        
-        return chunks
     
     async def process_docx(self, file_path: str) -> List[Dict[str, Any]]:
         """Process DOCX file"""
@@ -198,59 +278,67 @@ Be thorough and accurate."""
         self,
         text: str,
         metadata: Dict[str, Any],
-        chunk_size: int = None,
-        overlap: int = None
+        chunk_tokens: int = None,
+        overlap_tokens: int = None
     ) -> List[Dict[str, Any]]:
         """
-        Chunk text with overlap, preserving semantic boundaries
+        Chunk text with overlap, preserving semantic boundaries.
+        Sizes are in tokens, so chunks match the embedding model's real budget
         """
-        if chunk_size is None:
-            chunk_size = settings.CHUNK_SIZE
-        if overlap is None:
-            overlap = settings.CHUNK_OVERLAP
+        if chunk_tokens is None:
+            chunk_tokens = CHUNK_SIZE_TOKENS
+        if overlap_tokens is None:
+            overlap_tokens = CHUNK_OVERLAP_TOKENS
         
         # Split by paragraphs first
         paragraphs = text.split('\n\n')
         
+        # Token count per paragraph (tiktoken encodes the batch in Rust threads)
+        lengths = list(map(len, _ENC.encode_ordinary_batch(paragraphs)))
+        
+        # Boundaries are computed on lengths alone; each chunk is joined once from a slice
+        bounds = self._chunk_boundaries(lengths, chunk_tokens)
+        
         chunks = []
-        current_chunk = []
+        for start, end in bounds:
+            chunk_text = '\n\n'.join(paragraphs[start:end])
+            chunks.append({
+                'content': chunk_text,
+                'metadata': {
+                    **metadata,
+                    'chunk_tokens': sum(lengths[start:end])  # paragraph tokens, same unit as the limit
+                }
+            })
+        
+        return chunks
+    
+    @staticmethod
+    def _chunk_boundaries(lengths: List[int], chunk_tokens: int) -> List[Tuple[int, int]]:
+        """
+        (start, end) paragraph index ranges: a chunk closes once the next paragraph
+        would push it past chunk_tokens, and the next chunk starts with the last
+        paragraph of the previous one for context (overlap)
+        """
+        bounds = []
+        start = 0
         current_size = 0
         
-        for para in paragraphs:
-            para_size = len(para)
-            
-            if current_size + para_size > chunk_size and current_chunk:
-                # Save current chunk
-                chunk_text = '\n\n'.join(current_chunk)
-                chunks.append({
-                    'content': chunk_text,
-                    'metadata': {
-                        **metadata,
-                        'chunk_size': len(chunk_text)
-                    }
-                })
+        for i, para_size in enumerate(lengths):
+            if current_size + para_size > chunk_tokens and i > start:
+                bounds.append((start, i))
                 
-                # Start new chunk with overlap
                 # Keep last paragraph for context
-                if len(current_chunk) > 1:
-                    current_chunk = [current_chunk[-1], para]
-                    current_size = len(current_chunk[-1]) + para_size
+                if i - start > 1:
+                    start = i - 1
+                    current_size = lengths[i - 1] + para_size
                 else:
-                    current_chunk = [para]
+                    start = i
                     current_size = para_size
             else:
-                current_chunk.append(para)
                 current_size += para_size
         
         # Add final chunk
-        if current_chunk:
-            chunk_text = '\n\n'.join(current_chunk)
-            chunks.append({
-                'content': chunk_text,
-                'metadata': {
-                    **metadata,
-                    'chunk_size': len(chunk_text)
-                }
-            })
+        if start < len(lengths):
+            bounds.append((start, len(lengths)))
         
-        return chunks
\ No newline at end of file
+        return bounds
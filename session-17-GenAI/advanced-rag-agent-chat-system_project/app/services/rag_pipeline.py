@@ -1,9 +1,50 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 from loguru import logger
 from openai import AsyncOpenAI
 import numpy as np
+import asyncio
+import hashlib
+import json
 
 from app.core.config import settings
+from app.core.cache import LRUCache
+from app.services.vector_store import embedding_key
+
+RERANK_BATCH_SIZE = 10  # documents scored per LLM call
+RERANK_SKIP_OVERLAP = 0.8  # skip the LLM when vector distance and RRF agree on this share of the top-k
+
+# Structured output: the model must return {"scores": [int, ...]}
+RERANK_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "relevance_scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "scores": {"type": "array", "items": {"type": "integer"}}
+            },
+            "required": ["scores"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Parsed HyDE passages per normalized query, shared by every pipeline in this worker
+_hyde_cache = LRUCache(maxsize=1024, ttl=3600)
+
+# Query / hypothetical-doc embeddings, keyed by a digest of (model, text)
+_embedding_cache = LRUCache(maxsize=4096, ttl=3600)
+
+
+def _content_digest(content: str) -> str:
+    """Salt-free 64-bit content fingerprint: identical in every worker and across restarts
+    (unlike hash()), so it can key Redis or other shared caches"""
+    return hashlib.blake2b(content.encode('utf-8', 'ignore'), digest_size=8).hexdigest()
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
 
 
 class AdvancedRAGPipeline:
@@ -14,9 +55,9 @@ class AdvancedRAGPipeline:
     3. LLM-based Reranking
     """
     
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, client: AsyncOpenAI):
         self.vector_store = vector_store
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = client  # shared app-wide client
         
     async def query_optimization_hyde(self, query: str) -> List[str]:
         """
@@ -27,6 +68,13 @@ class AdvancedRAGPipeline:
         if not settings.HYDE_ENABLED:
             return [query]
         
+        # Repeat queries skip the LLM round trip (key includes the settings that shape the output)
+        cache_key = (_normalize_query(query), settings.CHAT_MODEL, settings.HYDE_NUM_HYPOTHETICAL_DOCS)
+        hypothetical_docs = _hyde_cache.get(cache_key)
+        if hypothetical_docs is not None:
+            logger.info(f"HyDE cache hit for: {query[:50]}...")
+            return [query] + hypothetical_docs
+        
         logger.info(f"Generating HyDE hypothetical documents for: {query[:50]}...")
         
         prompt = f"""Given the question: "{query}"
@@ -55,8 +103,11 @@ Format your response as a numbered list."""
                 if line and not line[0].isdigit():
                     hypothetical_docs.append(line)
             
+            hypothetical_docs = hypothetical_docs[:settings.HYDE_NUM_HYPOTHETICAL_DOCS]
+            _hyde_cache.set(cache_key, hypothetical_docs)
+            
             # Include original query as well
-            all_queries = [query] + hypothetical_docs[:settings.HYDE_NUM_HYPOTHETICAL_DOCS]
+            all_queries = [query] + hypothetical_docs
             
             logger.info(f"Generated {len(all_queries)} queries for retrieval")
             return all_queries
@@ -65,39 +116,69 @@ Format your response as a numbered list."""
             logger.error(f"HyDE generation failed: {str(e)}")
             return [query]
     
+    async def _embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Cached embeddings; all misses are fetched in one batched OpenAI request"""
+        keys = [embedding_key(query) for query in queries]
+        embeddings = [_embedding_cache.get(key) for key in keys]
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = await self.vector_store.get_embeddings([queries[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                _embedding_cache.set(keys[i], embedding)
+        
+        return embeddings
+    
+    async def _search_pair(
+        self,
+        query: str,
+        top_k: int,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """Dense and sparse search for one query, run concurrently"""
+        if query_embedding is None:
+            query_embedding = (await self._embed_queries([query]))[0]
+        
+        return await asyncio.gather(
+            # Dense retrieval (vector search)
+            self.vector_store.similarity_search_by_vector(query_embedding, k=top_k),
+            # Sparse retrieval (BM25 keyword search)
+            self.vector_store.keyword_search(query=query, k=top_k)
+        )
+    
     async def hybrid_search(
         self, 
         queries: List[str], 
-        top_k: int = None
+        top_k: int = None,
+        prefetched: Optional[Dict[str, asyncio.Task]] = None
     ) -> List[Dict[str, Any]]:
         """
         Hybrid Search combining:
         - Dense retrieval (semantic/vector search)
         - Sparse retrieval (keyword/BM25)
         - Reciprocal Rank Fusion (RRF) for combining results
+        
+        prefetched: query -> already running _search_pair task, reused instead of searching again
         """
         if top_k is None:
             top_k = settings.TOP_K_RETRIEVAL
+        prefetched = prefetched or {}
         
         logger.info(f"Performing hybrid search with {len(queries)} queries, top_k={top_k}")
         
-        all_results = []
+        # One embeddings request for every query not already being searched
+        to_embed = [query for query in queries if query not in prefetched]
+        embeddings = dict(zip(to_embed, await self._embed_queries(to_embed))) if to_embed else {}
         
-        for query in queries:
-            # Dense retrieval (vector search)
-            dense_results = await self.vector_store.similarity_search(
-                query=query,
-                k=top_k
-            )
-            
-            # Sparse retrieval (keyword search)
-            # Note: For full BM25, you'd need to implement this separately
-            # Here we'll use the vector store's metadata filtering as a proxy
-            sparse_results = await self.vector_store.keyword_search(
-                query=query,
-                k=top_k
-            )
-            
+        # All queries x (dense, sparse) in flight at once: wall time ~ one search, not 2N
+        pairs = await asyncio.gather(*[
+            prefetched.get(query) or self._search_pair(query, top_k, embeddings[query])
+            for query in queries
+        ])
+        
+        all_results = []
+        for dense_results, sparse_results in pairs:
             # Combine using RRF
             combined = self._reciprocal_rank_fusion(
                 dense_results,
@@ -123,30 +204,33 @@ Format your response as a numbered list."""
         Reciprocal Rank Fusion: RRF(d) = Σ(1 / (k + rank_i(d)))
         where k is a constant (typically 60) and rank_i(d) is the rank of document d in list i
         """
-        rrf_scores = {}
+        results = dense_results + sparse_results
+        if not results:
+            return []
         
-        # Score dense results
-        for rank, result in enumerate(dense_results, start=1):
-            doc_id = result.get('id', result.get('content', '')[:50])
-            if doc_id not in rrf_scores:
-                rrf_scores[doc_id] = {'score': 0, 'result': result}
-            rrf_scores[doc_id]['score'] += 1 / (k + rank)
+        # Rank of every entry within its own list, scored in one vectorized pass
+        ranks = np.concatenate([
+            np.arange(1, len(dense_results) + 1),
+            np.arange(1, len(sparse_results) + 1)
+        ])
+        scores = 1.0 / (k + ranks)
         
-        # Score sparse results
-        for rank, result in enumerate(sparse_results, start=1):
+        # Map each doc id to a slot (first occurrence wins), then sum its scores per slot
+        slots = {}
+        first_results = []
+        inverse = np.empty(len(results), dtype=np.intp)
+        for i, result in enumerate(results):
             doc_id = result.get('id', result.get('content', '')[:50])
-            if doc_id not in rrf_scores:
-                rrf_scores[doc_id] = {'score': 0, 'result': result}
-            rrf_scores[doc_id]['score'] += 1 / (k + rank)
-        
-        # Sort by RRF score
-        sorted_results = sorted(
-            rrf_scores.values(),
-            key=lambda x: x['score'],
-            reverse=True
-        )
+            slot = slots.get(doc_id)
+            if slot is None:
+                slot = slots[doc_id] = len(first_results)
+                first_results.append(result)
+            inverse[i] = slot
+        rrf_scores = np.bincount(inverse, weights=scores, minlength=len(first_results))
         
-        return [item['result'] for item in sorted_results]
+        # Sort by RRF score (stable: ties keep first-seen order)
+        order = np.argsort(-rrf_scores, kind='stable')
+        return [first_results[i] for i in order]
     
     def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
         """Remove duplicate results based on content similarity"""
@@ -154,8 +238,9 @@ Format your response as a numbered list."""
         unique_results = []
         
         for result in results:
-            content = result.get('content', '')
-            content_hash = hash(content[:100])  # Use first 100 chars for deduplication
+            # Whole content, not a 100-char prefix: templated docs sharing a header
+            # are no longer collapsed into one
+            content_hash = _content_digest(result.get('content', ''))
             
             if content_hash not in seen_content:
                 seen_content.add(content_hash)
@@ -177,9 +262,47 @@ Format your response as a numbered list."""
         
         logger.info(f"LLM reranking {len(results)} results to top {top_k}")
         
-        if len(results) <= top_k:
-            return results
+        # At most one candidate would be cut: not worth an LLM round trip
+        if len(results) <= top_k + 1:
+            return results[:top_k]
         
+        # Cheap local gate: rank by the vector distance each candidate was retrieved with
+        # (missing = keyword-only hit, ranked last). If that top-k mostly matches the
+        # RRF top-k (= the first top_k results), the LLM would rarely change the answer
+        distances = np.array([result.get('distance', np.inf) for result in results])
+        local_top = np.argsort(distances, kind='stable')[:top_k]
+        overlap = np.count_nonzero(local_top < top_k) / top_k
+        if overlap >= RERANK_SKIP_OVERLAP:
+            logger.info(f"Skipping LLM rerank: {overlap:.0%} top-{top_k} agreement")
+            return results[:top_k]
+        
+        try:
+            # Score in parallel batches: each call stays small, wall time ~ one batch
+            batches = [
+                results[start:start + RERANK_BATCH_SIZE]
+                for start in range(0, len(results), RERANK_BATCH_SIZE)
+            ]
+            batch_scores = await asyncio.gather(*[
+                self._score_batch(query, batch) for batch in batches
+            ])
+            scores = np.concatenate(batch_scores)
+            
+            # Sort by relevance score (stable: ties keep retrieval order)
+            order = np.argsort(-scores, kind='stable')[:top_k]
+            ranked_results = [
+                {**results[i], 'relevance_score': int(scores[i])}
+                for i in order
+            ]
+            
+            logger.info(f"Reranked results, top score: {ranked_results[0].get('relevance_score', 0)}")
+            return ranked_results
+            
+        except Exception as e:
+            logger.error(f"LLM reranking failed: {str(e)}, returning original order")
+            return results[:top_k]
+    
+    async def _score_batch(self, query: str, batch: List[Dict[str, Any]]) -> np.ndarray:
+        """Relevance scores (0-10) for one batch of results, one LLM call"""
         # Prepare ranking prompt
         ranking_prompt = f"""Given the query: "{query}"
 
@@ -191,44 +314,30 @@ Rate the relevance of each document passage to this query on a scale of 0-10, wh
 Documents:
 """
         
-        for i, result in enumerate(results, start=1):
+        for i, result in enumerate(batch, start=1):
             content = result.get('content', '')[:500]  # Limit to 500 chars
             ranking_prompt += f"\n{i}. {content}\n"
         
-        ranking_prompt += "\nProvide your ratings as a JSON array of numbers, e.g., [8, 3, 9, 7, ...]"
+        ranking_prompt += f"\nReturn exactly {len(batch)} scores, one per document, in order."
         
-        try:
-            response = await self.client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert at evaluating document relevance for information retrieval."},
-                    {"role": "user", "content": ranking_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Extract scores
-            import json
-            scores = json.loads(content.strip())
-            
-            # Combine results with scores
-            ranked_results = [
-                {**result, 'relevance_score': score}
-                for result, score in zip(results, scores)
-            ]
-            
-            # Sort by relevance score
-            ranked_results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
-            
-            logger.info(f"Reranked results, top score: {ranked_results[0].get('relevance_score', 0)}")
-            return ranked_results[:top_k]
-            
-        except Exception as e:
-            logger.error(f"LLM reranking failed: {str(e)}, returning original order")
-            return results[:top_k]
+        response = await self.client.chat.completions.create(
+            model=settings.CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": "You are an expert at evaluating document relevance for information retrieval."},
+                {"role": "user", "content": ranking_prompt}
+            ],
+            temperature=0.3,
+            max_tokens=100,
+            response_format=RERANK_RESPONSE_FORMAT  # schema-constrained: always parseable
+        )
+        
+        scores = json.loads(response.choices[0].message.content)["scores"]
+        
+        # Truncate/zero-pad to the batch size and clamp to the 0-10 scale
+        padded = np.zeros(len(batch))
+        scores = scores[:len(batch)]
+        padded[:len(scores)] = scores
+        return np.clip(padded, 0, 10)
     
     async def retrieve(
         self,
@@ -242,20 +351,40 @@ Documents:
         2. Hybrid Search
         3. LLM Reranking
         """
-        logger.info(f"Starting advanced RAG retrieval for query: {query[:50]}...")
-        
-        # Step 1: Query Optimization (HyDE)
-        if use_hyde:
-            queries = await self.query_optimization_hyde(query)
-        else:
-            queries = [query]
-        
-        # Step 2: Hybrid Search
-        results = await self.hybrid_search(queries, top_k=settings.TOP_K_RETRIEVAL)
+        results = await self.retrieve_candidates(query, use_hyde=use_hyde)
         
         # Step 3: LLM Reranking
         if use_reranking:
             results = await self.llm_rerank(query, results, top_k=settings.RERANK_TOP_K)
         
         logger.info(f"Retrieval complete, returning {len(results)} results")
-        return results
\ No newline at end of file
+        return results
+    
+    async def retrieve_candidates(
+        self,
+        query: str,
+        use_hyde: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Steps 1-2 (HyDE + Hybrid Search): RRF-ordered candidates, before reranking"""
+        logger.info(f"Starting advanced RAG retrieval for query: {query[:50]}...")
+        
+        # Start searching the raw query right away: it overlaps the HyDE LLM call,
+        # and the raw query is always the first of the HyDE queries anyway
+        raw_search = asyncio.create_task(self._search_pair(query, settings.TOP_K_RETRIEVAL))
+        
+        # Step 1: Query Optimization (HyDE)
+        try:
+            if use_hyde:
+                queries = await self.query_optimization_hyde(query)
+            else:
+                queries = [query]
+        except BaseException:
+            raw_search.cancel()
+            raise
+        
+        # Step 2: Hybrid Search
+        return await self.hybrid_search(
+            queries,
+            top_k=settings.TOP_K_RETRIEVAL,
+            prefetched={query: raw_search}
+        )
\ No newline at end of file
@@ -1,14 +1,77 @@
 from typing import List, Dict, Any, Optional
+from array import array
+from collections import Counter, defaultdict
+import asyncio
+import hashlib
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 import faiss
 import numpy as np
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 from loguru import logger
-import pickle
+import orjson
+import pyarrow as pa
 import os
 
 from app.core.config import settings
+from app.core.cache import LRUCache
+
+EMBEDDING_BATCH_SIZE = 256  # texts per embeddings request (the API takes arrays)
+OPENAI_MAX_CONCURRENCY = 32  # in-flight embeddings requests per worker
+EMBEDDING_MAX_RETRIES = 5    # attempts on 429 before giving up
+EMBEDDING_BACKOFF_BASE = 0.5  # seconds, doubled per retry
+EMBEDDING_CACHE_SIZE = 50_000  # chunk embeddings kept per worker (~300 MB at 1536-d fp32)
+
+BM25_K1 = 1.5                # term-frequency saturation
+BM25_B = 0.75                # document-length normalization
+KEYWORD_CANDIDATES = 200     # Chroma: term-matching documents fetched for BM25 ranking
+CHROMA_BATCH_SIZE = 1000     # records per collection.add call (server caps batch size)
+
+# Shared by every VectorStoreManager in the worker: bounds concurrent embedding calls
+_embedding_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# Chunk embeddings by content: re-uploaded or duplicated chunks skip the API.
+# No TTL - an embedding only changes with the model, which is part of the key
+_chunk_embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+
+
+def _bm25_weights(tf: np.ndarray, dl: np.ndarray, df: int, n_docs: int, avgdl: float) -> np.ndarray:
+    """BM25 contribution of one query term, vectorized over the documents (tf, dl)"""
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+
+
+def embedding_key(text: str) -> bytes:
+    """Content address of an embedding: digest of (model, text)"""
+    return hashlib.blake2b(f"{settings.EMBEDDING_MODEL}\0{text}".encode(), digest_size=16).digest()
+
+# FAISS: flat (brute-force) scan while small, then IVF + product quantization
+FAISS_FLAT_SPEC = "SQfp16"                   # 3 KB per vector instead of 6 KB, near-exact distances
+FAISS_NLIST = 4096                           # IVF cells
+FAISS_INDEX_SPEC = f"IVF{FAISS_NLIST},PQ64x8"  # 64 bytes per vector instead of 6 KB
+FAISS_TRAIN_SIZE = 40 * FAISS_NLIST          # vectors needed to train the quantizers
+FAISS_NPROBE = 16                            # cells scanned per query (recall vs speed)
+# OpenMP threads for FAISS scans: CPUs this process may actually run on (containers
+# pin fewer than os.cpu_count() reports), overridable with FAISS_THREADS
+FAISS_THREADS = int(os.environ.get(
+    "FAISS_THREADS",
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+))
+FAISS_METRIC = faiss.METRIC_INNER_PRODUCT    # on unit vectors: cosine similarity, a plain dot product
+# GPU search copy for large corpora (needs a faiss-gpu build); the CPU index stays the
+# source of truth for adds, deletes and write_index
+FAISS_USE_GPU = os.environ.get("FAISS_USE_GPU", "0") == "1" and faiss.get_num_gpus() > 0
+FAISS_GPU_MIN_VECTORS = 1_000_000  # below this the CPU scan is fast enough
+FAISS_GPU_RESYNC_ROWS = 50_000     # re-push the GPU copy after this many deletes
+
+_gpu_resources = None  # one StandardGpuResources (scratch memory, streams) per process
+
+
+def _get_gpu_resources():
+    global _gpu_resources
+    if _gpu_resources is None:
+        _gpu_resources = faiss.StandardGpuResources()
+    return _gpu_resources
 
 
 class VectorStoreManager:
@@ -16,19 +79,26 @@ class VectorStoreManager:
     Manages both ChromaDB (production) and FAISS (demo) vector stores
     """
     
-    def __init__(self, use_chroma: bool = True):
+    def __init__(self, openai_client: AsyncOpenAI, use_chroma: bool = True):
         self.use_chroma = use_chroma
-        self.client_openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client_openai = openai_client  # shared app-wide client
         
-        if use_chroma:
-            self._init_chroma()
-        else:
+        if not use_chroma:
             self._init_faiss()
     
-    def _init_chroma(self):
+    @classmethod
+    async def create(cls, openai_client: AsyncOpenAI, use_chroma: bool = True) -> "VectorStoreManager":
+        """Construct and connect (the async Chroma client can't be set up in __init__)"""
+        manager = cls(openai_client, use_chroma)
+        if use_chroma:
+            await manager._init_chroma()
+        return manager
+    
+    async def _init_chroma(self):
         """Initialize ChromaDB client"""
         try:
-            self.chroma_client = chromadb.HttpClient(
+            # Async client: Chroma calls no longer block the event loop
+            self.chroma_client = await chromadb.AsyncHttpClient(
                 host=settings.CHROMA_HOST,
                 port=settings.CHROMA_PORT,
                 settings=ChromaSettings(
@@ -38,7 +108,7 @@ class VectorStoreManager:
             )
             
             # Get or create collection
-            self.collection = self.chroma_client.get_or_create_collection(
+            self.collection = await self.chroma_client.get_or_create_collection(
                 name="rag_documents",
                 metadata={"description": "Advanced RAG document embeddings"}
             )
@@ -51,23 +121,126 @@ class VectorStoreManager:
     def _init_faiss(self):
         """Initialize FAISS index"""
         self.dimension = 1536  # OpenAI embedding dimension
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.id_to_metadata = {}
+        faiss.omp_set_num_threads(FAISS_THREADS)
+        logger.info(
+            f"FAISS using {faiss.omp_get_max_threads()} threads "
+            f"(compile options: {faiss.get_compile_options()})"
+        )
+        # Brute-force search until FAISS_TRAIN_SIZE vectors exist, then swapped for IVF+PQ.
+        # fp16 storage halves the memory traffic of the (bandwidth-bound) scan; adds stay fp32.
+        # The flat stage stores no ids of its own, so IDMap2 maps its positions to row ids
+        # (and compacts both together on remove_ids). The trained IVF index stores the
+        # row ids natively in its inverted lists and is used unwrapped
+        self.index = faiss.IndexIDMap2(
+            faiss.index_factory(self.dimension, FAISS_FLAT_SPEC, FAISS_METRIC)
+        )
+        self.trained = False
+        self._gpu_index = None  # search copy: gets every add, deletes only on re-push
+        self._gpu_pending = 0   # rows deleted since the last push
+        self._faiss_lock = asyncio.Lock()  # no adds while the index is being retrained
+        # Per-row columns indexed directly by FAISS row id (None once deleted)
+        self.doc_ids = []
+        self.texts = []
+        self.metadatas = []
+        self._init_postings()
         self.next_id = 0
         logger.info("FAISS initialized successfully")
     
-    async def get_embedding(self, text: str) -> List[float]:
-        """Get embedding from OpenAI"""
+    async def _create_embeddings(self, input):
+        """
+        embeddings.create with bounded concurrency and exponential backoff on rate limits
+        (gathered batches would otherwise all hit the API at once and fail together)
+        """
+        for attempt in range(EMBEDDING_MAX_RETRIES):
+            try:
+                async with _embedding_semaphore:
+                    return await self.client_openai.embeddings.create(
+                        model=settings.EMBEDDING_MODEL,
+                        input=input
+                    )
+            except RateLimitError:
+                if attempt == EMBEDDING_MAX_RETRIES - 1:
+                    raise
+                delay = EMBEDDING_BACKOFF_BASE * 2 ** attempt
+                logger.warning(f"Embeddings rate limited, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)  # outside the semaphore: others may proceed
+    
+    async def get_embedding(self, text: str) -> np.ndarray:
+        """Get embedding from OpenAI (float32 vector, ready for FAISS)"""
         try:
-            response = await self.client_openai.embeddings.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
-            )
-            return response.data[0].embedding
+            response = await self._create_embeddings(text)
+            return np.asarray(response.data[0].embedding, dtype=np.float32)
         except Exception as e:
             logger.error(f"Failed to get embedding: {str(e)}")
             raise
     
+    async def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for many texts in one OpenAI request: float32 rows in texts order"""
+        try:
+            response = await self._create_embeddings(texts)
+            return np.array([item.embedding for item in response.data], dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Failed to get embeddings: {str(e)}")
+            raise
+    
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into one (len(texts), dim) float32 matrix; cached and repeated
+        texts are looked up, only the distinct misses go to OpenAI
+        """
+        keys = [embedding_key(text) for text in texts]
+        hits = {}
+        miss_rows = {}  # key -> rows with that text (duplicates are embedded once)
+        for row, key in enumerate(keys):
+            if key in hits:
+                continue
+            if key not in miss_rows:
+                vector = _chunk_embedding_cache.get(key)
+                if vector is not None:
+                    hits[key] = vector
+                    continue
+            miss_rows.setdefault(key, []).append(row)
+        
+        if not miss_rows:
+            return np.stack([hits[key] for key in keys])
+        
+        fresh = await self._embed_uncached([texts[rows[0]] for rows in miss_rows.values()])
+        out = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+        for vector, (key, rows) in zip(fresh, miss_rows.items()):
+            out[rows] = vector
+            _chunk_embedding_cache.set(key, vector.copy())  # copy: don't pin the whole batch
+        for row, key in enumerate(keys):
+            if key in hits:
+                out[row] = hits[key]
+        
+        logger.info(f"Embedded {len(miss_rows)} distinct new texts out of {len(texts)}")
+        return out
+    
+    async def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed any number of texts into one (len(texts), dim) float32 matrix: requests of
+        EMBEDDING_BATCH_SIZE are sent concurrently and each response is copied straight
+        into its rows (no list-of-lists -> array conversion afterwards)
+        """
+        out = None
+        
+        async def embed_into(start: int):
+            nonlocal out
+            response = await self._create_embeddings(texts[start:start + EMBEDDING_BATCH_SIZE])
+            if out is None:  # first response tells the dimension
+                out = np.empty((len(texts), len(response.data[0].embedding)), dtype=np.float32)
+            for i, item in enumerate(response.data):
+                out[start + i] = item.embedding
+        
+        try:
+            await asyncio.gather(*[
+                embed_into(start) for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+            ])
+        except Exception as e:
+            logger.error(f"Failed to get embeddings: {str(e)}")
+            raise
+        return out
+    
     async def add_documents(
         self,
         texts: List[str],
@@ -80,11 +253,30 @@ class VectorStoreManager:
         
         logger.info(f"Adding {len(texts)} documents to vector store")
         
-        # Generate embeddings
-        embeddings = []
-        for text in texts:
-            embedding = await self.get_embedding(text)
-            embeddings.append(embedding)
+        if self.use_chroma and ids is None:
+            ids = [f"doc_{i}" for i in range(len(texts))]  # fixed up front: batches can't collide
+        
+        # Pipelined: each batch is inserted as soon as its embeddings arrive, while the
+        # later batches are still in flight (ingestion ~ max(embed, insert), not the sum)
+        batches = [slice(i, i + EMBEDDING_BATCH_SIZE) for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        added = await asyncio.gather(*[
+            self._embed_and_add(
+                texts[s],
+                metadatas[s] if metadatas is not None else None,
+                ids[s] if ids is not None else None
+            )
+            for s in batches
+        ])
+        return [doc_id for batch_ids in added for doc_id in batch_ids]
+    
+    async def _embed_and_add(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]],
+        ids: Optional[List[str]]
+    ) -> List[str]:
+        """Embed one batch (cache-aware) and insert it into the active store"""
+        embeddings = await self._embed_batch(texts)
         
         if self.use_chroma:
             return await self._add_to_chroma(texts, embeddings, metadatas, ids)
@@ -94,7 +286,7 @@ class VectorStoreManager:
     async def _add_to_chroma(
         self,
         texts: List[str],
-        embeddings: List[List[float]],
+        embeddings: np.ndarray,
         metadatas: Optional[List[Dict]],
         ids: Optional[List[str]]
     ) -> List[str]:
@@ -105,12 +297,17 @@ class VectorStoreManager:
         if metadatas is None:
             metadatas = [{}] * len(texts)
         
-        self.collection.add(
-            documents=texts,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Sub-batches within the server's limit, sent concurrently
+        batches = [slice(i, i + CHROMA_BATCH_SIZE) for i in range(0, len(texts), CHROMA_BATCH_SIZE)]
+        await asyncio.gather(*[
+            self.collection.add(
+                documents=texts[s],
+                embeddings=embeddings[s],
+                metadatas=metadatas[s],
+                ids=ids[s]
+            )
+            for s in batches
+        ])
         
         logger.info(f"Added {len(texts)} documents to ChromaDB")
         return ids
@@ -118,35 +315,103 @@ class VectorStoreManager:
     async def _add_to_faiss(
         self,
         texts: List[str],
-        embeddings: List[List[float]],
+        embeddings: np.ndarray,
         metadatas: Optional[List[Dict]],
         ids: Optional[List[str]]
     ) -> List[str]:
         """Add documents to FAISS"""
-        embeddings_array = np.array(embeddings).astype('float32')
-        
-        # Add to index
-        start_id = self.next_id
-        self.index.add(embeddings_array)
-        
-        # Store metadata
-        if ids is None:
-            ids = [f"doc_{i}" for i in range(start_id, start_id + len(texts))]
+        embeddings_array = np.ascontiguousarray(embeddings, dtype=np.float32)  # no copy here
+        faiss.normalize_L2(embeddings_array)  # in place: inner product == cosine
         
-        if metadatas is None:
-            metadatas = [{}] * len(texts)
-        
-        for i, (text, metadata, doc_id) in enumerate(zip(texts, metadatas, ids)):
-            self.id_to_metadata[start_id + i] = {
-                'id': doc_id,
-                'text': text,
-                'metadata': metadata
-            }
+        async with self._faiss_lock:
+            # Add to index: row ids are the positions in the metadata columns
+            start_id = self.next_id
+            row_ids = np.arange(start_id, start_id + len(texts), dtype='int64')
+            self.index.add_with_ids(embeddings_array, row_ids)
+            if self._gpu_index is not None:
+                # Same rows into the GPU copy: new documents are searchable right away.
+                # On the loop thread like the CPU add, so never concurrent with a search
+                self._gpu_index.add_with_ids(embeddings_array, row_ids)
+            
+            # Store metadata
+            if ids is None:
+                ids = [f"doc_{i}" for i in range(start_id, start_id + len(texts))]
+            
+            if metadatas is None:
+                metadatas = [{}] * len(texts)
+            
+            self.doc_ids.extend(ids)
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            self._index_terms(start_id, texts)
+            
+            self.next_id += len(texts)
+            
+            if not self.trained and self.index.ntotal >= FAISS_TRAIN_SIZE:
+                # One-off: train IVF+PQ on everything so far (seconds of CPU, off the loop)
+                self.index = await asyncio.to_thread(self._train_ivf_pq, self.index)
+                self.trained = True
+                self._gpu_index = None  # copy of the old index
+            
+            if self._gpu_sync_due():
+                self._gpu_index = await asyncio.to_thread(self._to_gpu, self.index)
+                self._gpu_pending = 0
         
-        self.next_id += len(texts)
         logger.info(f"Added {len(texts)} documents to FAISS")
         return ids
     
+    def _gpu_sync_due(self) -> bool:
+        """Large enough for the GPU, and its copy missing or holding too many deleted rows"""
+        if not FAISS_USE_GPU or self.index.ntotal < FAISS_GPU_MIN_VECTORS:
+            return False
+        return self._gpu_index is None or self._gpu_pending >= FAISS_GPU_RESYNC_ROWS
+    
+    @staticmethod
+    def _to_gpu(index: faiss.Index) -> faiss.Index:
+        """GPU clone of the index (row ids kept)"""
+        options = faiss.GpuClonerOptions()
+        # fp16 PQ lookup tables: 64 sub-quantizers x 256 x 4 B would not fit in the
+        # 48 KB of shared memory most GPUs have
+        options.useFloat16 = True
+        gpu_index = faiss.index_cpu_to_gpu(_get_gpu_resources(), 0, index, options)
+        logger.info(f"FAISS index copied to GPU ({index.ntotal} vectors)")
+        return gpu_index
+    
+    def _init_postings(self):
+        """Empty BM25 inverted index, kept as append-only C int arrays (no per-entry objects)"""
+        self.postings = defaultdict(lambda: (array('i'), array('i')))  # term -> (rows, term freqs)
+        self.doc_len = array('i')  # terms per row, -1 once deleted
+        self.total_len = 0         # over live rows
+        self.live_docs = 0
+    
+    def _index_terms(self, start_row: int, texts: List[Optional[str]]):
+        """Append each text's term frequencies to the postings and its length to doc_len"""
+        for row, text in enumerate(texts, start=start_row):
+            if text is None:  # deleted row (on load)
+                self.doc_len.append(-1)
+                continue
+            terms = text.lower().split()
+            for term, tf in Counter(terms).items():
+                rows, tfs = self.postings[term]
+                rows.append(row)
+                tfs.append(tf)
+            self.doc_len.append(len(terms))
+            self.total_len += len(terms)
+            self.live_docs += 1
+    
+    def _train_ivf_pq(self, flat_index: faiss.IndexIDMap2) -> faiss.Index:
+        """IVF+PQ index trained on, and filled with, the flat index's vectors (same ids, fp16-decoded)"""
+        vectors = faiss.downcast_index(flat_index.index).reconstruct_n(0, flat_index.ntotal)
+        row_ids = faiss.vector_to_array(flat_index.id_map)
+        # Not wrapped in IDMap2: IndexIVF::remove_ids doesn't renumber the list entries,
+        # so an id_map compacted around it would point surviving hits at the wrong rows
+        index = faiss.index_factory(self.dimension, FAISS_INDEX_SPEC, FAISS_METRIC)
+        index.train(vectors)
+        index.add_with_ids(vectors, row_ids)
+        faiss.extract_index_ivf(index).nprobe = FAISS_NPROBE
+        logger.info(f"FAISS switched to {FAISS_INDEX_SPEC} ({index.ntotal} vectors)")
+        return index
+    
     async def similarity_search(
         self,
         query: str,
@@ -159,6 +424,15 @@ class VectorStoreManager:
         # Get query embedding
         query_embedding = await self.get_embedding(query)
         
+        return await self.similarity_search_by_vector(query_embedding, k, filter_dict)
+    
+    async def similarity_search_by_vector(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """Similarity search with an already computed query embedding"""
         if self.use_chroma:
             return await self._search_chroma(query_embedding, k, filter_dict)
         else:
@@ -166,47 +440,54 @@ class VectorStoreManager:
     
     async def _search_chroma(
         self,
-        query_embedding: List[float],
+        query_embedding: np.ndarray,
         k: int,
         filter_dict: Optional[Dict]
     ) -> List[Dict[str, Any]]:
         """Search in ChromaDB"""
-        results = self.collection.query(
+        results = await self.collection.query(
             query_embeddings=[query_embedding],
             n_results=k,
             where=filter_dict
         )
         
-        formatted_results = []
-        for i in range(len(results['ids'][0])):
-            formatted_results.append({
-                'id': results['ids'][0][i],
-                'content': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]
-            })
+        # Single query: bind its result columns once and zip them
+        ids, documents, metadatas, distances = (
+            results[key][0] for key in ('ids', 'documents', 'metadatas', 'distances')
+        )
+        formatted_results = [
+            {'id': doc_id, 'content': content, 'metadata': metadata, 'distance': distance}
+            for doc_id, content, metadata, distance in zip(ids, documents, metadatas, distances)
+        ]
         
         return formatted_results
     
     async def _search_faiss(
         self,
-        query_embedding: List[float],
+        query_embedding: np.ndarray,
         k: int
     ) -> List[Dict[str, Any]]:
         """Search in FAISS"""
-        query_array = np.array([query_embedding]).astype('float32')
-        distances, indices = self.index.search(query_array, k)
+        # Copy: normalized in place, and the caller's vector may be a cached one
+        query_array = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(query_array)
+        index = self._gpu_index if self._gpu_index is not None else self.index
+        similarities, indices = index.search(query_array, k)
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1 and idx in self.id_to_metadata:
-                metadata = self.id_to_metadata[idx]
-                results.append({
-                    'id': metadata['id'],
-                    'content': metadata['text'],
-                    'metadata': metadata.get('metadata', {}),
-                    'distance': float(distances[0][i])
-                })
+        # One tolist() per row converts every id / similarity to Python scalars at once;
+        # row ids index the columns directly (no dict hashing), -1 means fewer than k vectors,
+        # a None id a row deleted since the last GPU push
+        doc_ids, texts, metadatas = self.doc_ids, self.texts, self.metadatas  # no attribute lookups per hit
+        results = [
+            {
+                'id': doc_ids[idx],
+                'content': texts[idx],
+                'metadata': metadatas[idx] or {},
+                'distance': 1.0 - similarity  # cosine distance: lower is closer, as before
+            }
+            for idx, similarity in zip(indices[0].tolist(), similarities[0].tolist())
+            if idx != -1 and doc_ids[idx] is not None
+        ]
         
         return results
     
@@ -216,64 +497,161 @@ class VectorStoreManager:
         k: int = 5
     ) -> List[Dict[str, Any]]:
         """
-        Simple keyword-based search (BM25 approximation)
+        Keyword-based search (BM25), the sparse half of hybrid search
         For production, consider using Elasticsearch or similar
         """
-        # For now, we'll do a simple text matching
-        # This is a placeholder - in production you'd use proper BM25
+        terms = list(dict.fromkeys(query.lower().split()))  # unique terms, in order
         
         if self.use_chroma:
-            # ChromaDB doesn't have built-in BM25, so we'll use metadata search
-            # In production, integrate with Elasticsearch
-            return await self.similarity_search(query, k)
+            # ChromaDB has no BM25: fetch documents containing any term with its document
+            # filter and rank them locally (no dense fallback - hybrid search already runs it).
+            # $contains is a case-sensitive substring match, so filter on the query's own
+            # spelling plus its lower and capitalized forms; scoring below is case-insensitive
+            if not terms:
+                return []
+            variants = dict.fromkeys(
+                variant
+                for term in query.split()
+                for variant in (term, term.lower(), term.capitalize())
+            )
+            contains = [{"$contains": variant} for variant in variants]
+            found = await self.collection.get(
+                where_document=contains[0] if len(contains) == 1 else {"$or": contains},
+                limit=KEYWORD_CANDIDATES,
+                include=["documents", "metadatas"]
+            )
+            documents = found['documents']
+            if not documents:
+                return []
+            
+            # N, df and avgdl all over the candidates: the collection's df isn't known,
+            # and mixing it with the collection's N would inflate every idf
+            n_docs = len(documents)
+            term_counts = [Counter(document.lower().split()) for document in documents]
+            dl = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+            avgdl = max(float(dl.mean()), 1.0)
+            scores = np.zeros(len(documents))
+            for term in terms:
+                tf = np.array([counts[term] for counts in term_counts], dtype=np.float32)
+                df = np.count_nonzero(tf)
+                if df:
+                    scores += _bm25_weights(tf, dl, df, n_docs, avgdl)  # 0 where tf == 0
+            
+            top = np.argsort(-scores, kind='stable')[:k].tolist()
+            scores = scores.tolist()
+            return [
+                {
+                    'id': found['ids'][i],
+                    'content': documents[i],
+                    'metadata': found['metadatas'][i] or {},
+                    'score': scores[i]
+                }
+                for i in top
+                if scores[i] > 0
+            ]
         else:
-            # For FAISS, we'll do simple keyword matching
-            query_terms = query.lower().split()
-            scored_docs = []
+            # For FAISS, BM25 over the inverted index: each query term's postings are
+            # scored as whole NumPy arrays, work is proportional to the matching postings
+            if not self.live_docs:
+                return []
+            avgdl = self.total_len / self.live_docs
+            row_parts, weight_parts = [], []
+            
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                rows = np.array(posting[0], dtype=np.intc)  # copies: the arrays keep growing
+                tf = np.array(posting[1], dtype=np.float32)
+                dl = np.frombuffer(self.doc_len, dtype=np.intc)[rows]
+                live = dl >= 0
+                rows, tf, dl = rows[live], tf[live], dl[live]
+                row_parts.append(rows)
+                weight_parts.append(_bm25_weights(tf, dl, len(rows), self.live_docs, avgdl))
             
-            for idx, metadata in self.id_to_metadata.items():
-                text = metadata['text'].lower()
-                score = sum(term in text for term in query_terms)
-                if score > 0:
-                    scored_docs.append((score, idx))
+            if not row_parts:
+                return []
             
-            scored_docs.sort(reverse=True)
+            # Sum per row, then top-k: argpartition, and a sort of only those k
+            rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(weight_parts))
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
             
-            results = []
-            for score, idx in scored_docs[:k]:
-                metadata = self.id_to_metadata[idx]
-                results.append({
-                    'id': metadata['id'],
-                    'content': metadata['text'],
-                    'metadata': metadata.get('metadata', {}),
+            doc_ids, texts, metadatas = self.doc_ids, self.texts, self.metadatas
+            results = [
+                {
+                    'id': doc_ids[idx],
+                    'content': texts[idx],
+                    'metadata': metadatas[idx] or {},
                     'score': score
-                })
+                }
+                for idx, score in zip(rows[order].tolist(), scores[order].tolist())
+            ]
             
             return results
     
     async def delete_documents(self, ids: List[str]):
         """Delete documents by IDs"""
         if self.use_chroma:
-            self.collection.delete(ids=ids)
+            await self.collection.delete(ids=ids)
             logger.info(f"Deleted {len(ids)} documents from ChromaDB")
         else:
-            # FAISS doesn't support deletion easily
-            # Would need to rebuild index
-            logger.warning("FAISS doesn't support efficient deletion")
+            wanted = set(ids)
+            rows = [row for row, doc_id in enumerate(self.doc_ids) if doc_id in wanted]
+            async with self._faiss_lock:
+                self.index.remove_ids(np.array(rows, dtype='int64'))
+                self._gpu_pending += len(rows)  # GPU copy still has them until re-pushed
+                if self._gpu_sync_due():
+                    self._gpu_index = await asyncio.to_thread(self._to_gpu, self.index)
+                    self._gpu_pending = 0
+            for row in rows:
+                self.doc_ids[row] = self.texts[row] = self.metadatas[row] = None
+                self.total_len -= self.doc_len[row]
+                self.doc_len[row] = -1  # postings entries are skipped from now on
+                self.live_docs -= 1
+            logger.info(f"Deleted {len(rows)} documents from FAISS")
     
     def save_faiss_index(self, path: str = "faiss_index"):
         """Save FAISS index to disk"""
         if not self.use_chroma:
             os.makedirs(path, exist_ok=True)
             faiss.write_index(self.index, f"{path}/index.faiss")
-            with open(f"{path}/metadata.pkl", 'wb') as f:
-                pickle.dump(self.id_to_metadata, f)
+            # Columnar Arrow IPC file, one row per FAISS row id (nulls for deleted rows)
+            table = pa.table({
+                'id': pa.array(self.doc_ids, type=pa.string()),
+                'text': pa.array(self.texts, type=pa.string()),
+                'metadata_json': pa.array(
+                    [None if m is None else orjson.dumps(m).decode() for m in self.metadatas],
+                    type=pa.string()
+                )
+            })
+            with pa.OSFile(f"{path}/metadata.arrow", 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
             logger.info(f"FAISS index saved to {path}")
     
     def load_faiss_index(self, path: str = "faiss_index"):
         """Load FAISS index from disk"""
         if not self.use_chroma:
             self.index = faiss.read_index(f"{path}/index.faiss")
-            with open(f"{path}/metadata.pkl", 'rb') as f:
-                self.id_to_metadata = pickle.load(f)
+            self.trained = faiss.try_extract_index_ivf(self.index) is not None
+            if self.trained:
+                faiss.extract_index_ivf(self.index).nprobe = FAISS_NPROBE  # not persisted
+            # Memory-mapped read (no copy of the file), columns converted in C
+            with pa.memory_map(f"{path}/metadata.arrow") as source:
+                table = pa.ipc.open_file(source).read_all()
+                self.doc_ids = table.column('id').to_pylist()
+                self.texts = table.column('text').to_pylist()
+                metadata_json = table.column('metadata_json').to_pylist()
+            self.metadatas = [None if m is None else orjson.loads(m) for m in metadata_json]
+            self.next_id = len(self.doc_ids)
+            self._gpu_index = None
+            self._gpu_pending = 0
+            if self._gpu_sync_due():
+                self._gpu_index = self._to_gpu(self.index)
+            self._init_postings()
+            self._index_terms(0, self.texts)
             logger.info(f"FAISS index loaded from {path}")
\ No newline at end of file
@@ -5,10 +5,21 @@ WebSocket Test Client for Advanced RAG Agent Chat System
 
 import asyncio
 import websockets
-import json
+import orjson
 import sys
 
 
+async def read_frames(websocket, frames: asyncio.Queue):
+    """Drain the socket continuously into a queue (None once the connection closes)"""
+    try:
+        async for message in websocket:
+            await frames.put(orjson.loads(message))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        await frames.put(None)
+
+
 async def chat_session():
     """Start an interactive chat session via WebSocket"""
     
@@ -26,22 +37,27 @@ async def chat_session():
             print("✓ Connected successfully!")
             print("Type your questions below. Type 'exit' to quit.\n")
             
+            # Frames keep being received (and pings answered) while the user types
+            frames = asyncio.Queue()
+            reader = asyncio.create_task(read_frames(websocket, frames))
+            
             while True:
-                # Get user input
-                query = input("You: ").strip()
+                # Get user input (in a thread, so the event loop keeps running)
+                query = (await asyncio.to_thread(input, "You: ")).strip()
                 
                 if query.lower() in ['exit', 'quit', 'q']:
                     print("Goodbye!")
+                    reader.cancel()
                     break
                 
                 if not query:
                     continue
                 
-                # Send query
-                await websocket.send(json.dumps({
+                # Send query (decoded: the server reads text frames, not binary)
+                await websocket.send(orjson.dumps({
                     "query": query,
                     "user_id": "test_user"
-                }))
+                }).decode())
                 
                 print("\nAssistant: ", end="", flush=True)
                 
@@ -50,42 +66,39 @@ async def chat_session():
                 sources = []
                 
                 while not response_complete:
-                    try:
-                        message = await websocket.recv()
-                        data = json.loads(message)
-                        
-                        msg_type = data.get("type")
-                        
-                        if msg_type == "status":
-                            # Show status updates in gray
-                            print(f"\n[{data.get('message')}]", end="", flush=True)
-                        
-                        elif msg_type == "workflow":
-                            # Show workflow plan
-                            plan = data.get("plan", {})
-                            print(f"\n[Workflow: {plan.get('explanation', 'N/A')}]", end="", flush=True)
-                        
-                        elif msg_type == "retrieval":
-                            # Show retrieval info
-                            num_docs = data.get("num_docs", 0)
-                            print(f"\n[Retrieved {num_docs} documents]", end="", flush=True)
-                        
-                        elif msg_type == "content":
-                            # Print content as it streams
-                            print(data.get("content", ""), end="", flush=True)
-                        
-                        elif msg_type == "complete":
-                            # Response is complete
-                            sources = data.get("sources", [])
-                            response_complete = True
-                        
-                        elif msg_type == "error":
-                            print(f"\n\nError: {data.get('message')}")
-                            response_complete = True
-                    
-                    except websockets.exceptions.ConnectionClosed:
+                    data = await frames.get()
+                    if data is None:
                         print("\n\nConnection closed by server")
                         return
+                    
+                    msg_type = data.get("type")
+                    
+                    if msg_type == "status":
+                        # Show status updates in gray
+                        print(f"\n[{data.get('message')}]", end="", flush=True)
+                    
+                    elif msg_type == "workflow":
+                        # Show workflow plan
+                        plan = data.get("plan", {})
+                        print(f"\n[Workflow: {plan.get('explanation', 'N/A')}]", end="", flush=True)
+                    
+                    elif msg_type == "retrieval":
+                        # Show retrieval info
+                        num_docs = data.get("num_docs", 0)
+                        print(f"\n[Retrieved {num_docs} documents]", end="", flush=True)
+                    
+                    elif msg_type == "content":
+                        # Print content as it streams
+                        print(data.get("content", ""), end="", flush=True)
+                    
+                    elif msg_type == "complete":
+                        # Response is complete
+                        sources = data.get("sources", [])
+                        response_complete = True
+                    
+                    elif msg_type == "error":
+                        print(f"\n\nError: {data.get('message')}")
+                        response_complete = True
                 
                 # Show sources if available
                 if sources:
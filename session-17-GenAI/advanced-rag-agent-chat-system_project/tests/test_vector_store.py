@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from app.services import vector_store as vs
+
+
+class TestFaissTrainedIndex():
+    def test_delete_after_training_keeps_rows_aligned(self, monkeypatch):
+        # Arrange: a tiny IVF index (Flat codes + every list probed, so search is exact)
+        monkeypatch.setattr(vs, "FAISS_INDEX_SPEC", "IVF4,Flat")
+        monkeypatch.setattr(vs, "FAISS_TRAIN_SIZE", 200)
+        monkeypatch.setattr(vs, "FAISS_NPROBE", 4)
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((300, 1536)).astype(np.float32)
+        texts = [f"text {i}" for i in range(300)]
+        ids = [f"doc_{i}" for i in range(300)]
+        store = vs.VectorStoreManager(openai_client=None, use_chroma=False)
+
+        # Action: add past the training threshold, delete, then search
+        async def scenario():
+            await store._add_to_faiss(texts, vectors.copy(), None, ids)
+            assert store.trained
+            await store.delete_documents(ids[:50])
+            kept = {i: await store._search_faiss(vectors[i], k=1) for i in (50, 150, 299)}
+            near_deleted = await store._search_faiss(vectors[0], k=5)
+            return kept, near_deleted
+
+        kept, near_deleted = asyncio.run(scenario())
+
+        # Assert: surviving rows still map to their own documents, deleted ones never come back
+        for i, results in kept.items():
+            assert results[0]['id'] == ids[i]
+            assert results[0]['content'] == texts[i]
+        assert all(result['id'] not in ids[:50] for result in near_deleted)